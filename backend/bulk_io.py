@@ -0,0 +1,152 @@
+# backend/bulk_io.py
+import csv, io, json, time, codecs, asyncio, logging
+
+from fastapi import Request
+from pydantic import ValidationError
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK = 500        # 1回の複数行 INSERT に載せる件数
+BULK_MAX_IN_FLIGHT = 4  # 同時に投げる INSERT の数
+MAX_REPORTED_ERRORS = 100
+
+CSV_TYPES = ("text/csv", "application/csv")
+EXPORT_FIELDS = ("id", "title", "description", "category")
+
+
+async def _lines(request: Request):
+    """リクエスト本文を全部読まずに1行ずつ返す"""
+    buffer = ""
+    # チャンク境界でマルチバイト文字が割れても復元できるよう逐次デコードする
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def iter_records(request: Request):
+    """NDJSON または CSV（1行目がヘッダ）の本文を (行番号, dict) で返す
+
+    CSV は引用符の中の改行を含む1レコードを複数行に分けて受け取るので、
+    引用符が閉じるまで行をためてから csv.reader に渡す。
+    """
+    is_csv = request.headers.get("content-type", "").split(";")[0].strip() in CSV_TYPES
+    header = None
+    lineno = 0
+    pending: list[str] = []
+    quotes = 0
+    async for line in _lines(request):
+        lineno += 1
+        if is_csv:
+            if not pending and not line.strip():
+                continue
+            pending.append(line + "\n")
+            # "" のエスケープも2個ずつなので、" の数が奇数なら引用符の途中
+            quotes += line.count('"')
+            if quotes % 2:
+                continue
+            start = lineno - len(pending) + 1
+            values = next(csv.reader(pending))
+            pending, quotes = [], 0
+            if header is None:
+                header = [h.strip() for h in values]
+                continue
+            yield start, dict(zip(header, values))
+        elif line.strip():
+            try:
+                yield lineno, json.loads(line)
+            except ValueError as e:
+                yield lineno, e
+    if pending:
+        yield lineno - len(pending) + 1, ValueError("引用符が閉じていません")
+
+
+async def bulk_import(records, model, insert_batch, chunk: int = BULK_CHUNK,
+                      max_in_flight: int = BULK_MAX_IN_FLIGHT) -> dict:
+    """チャンク単位で検証し、insert_batch(rows) で複数行 INSERT する
+
+    同時に実行する INSERT は max_in_flight 件まで。結果として件数と rows/s を返す。
+    """
+    started = time.perf_counter()
+    received = inserted = rejected = failed = 0
+    errors: list[dict] = []
+    slots = asyncio.Semaphore(max_in_flight)
+    # 失敗したチャンクも後で報告できるよう、終わったタスクも含めて全部持っておく
+    chunks: list[tuple[str, int, asyncio.Task]] = []
+
+    async def flush(rows: list[dict]) -> None:
+        nonlocal inserted
+        async with slots:
+            # `inserted += await ...` だと await 前の値に足してしまうので分ける
+            count = await insert_batch(rows)
+        inserted += count
+
+    batch: list[dict] = []
+    first_line = None
+    async for lineno, record in records:
+        received += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append(model.model_validate(record).model_dump())
+            first_line = first_line or lineno
+        except (ValidationError, ValueError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": lineno, "error": str(e)})
+            continue
+        if len(batch) >= chunk:
+            # 受信を止めないよう INSERT はタスクで進め、同時数はセマフォで抑える
+            await slots.acquire()
+            slots.release()
+            chunks.append((f"{first_line}-{lineno}", len(batch), asyncio.create_task(flush(batch))))
+            batch, first_line = [], None
+    if batch:
+        chunks.append((f"{first_line}-{lineno}", len(batch), asyncio.create_task(flush(batch))))
+    results = await asyncio.gather(*(task for _, _, task in chunks), return_exceptions=True)
+    for (lines, size, _), result in zip(chunks, results):
+        if isinstance(result, BaseException):
+            failed += size
+            logger.error(f"一括登録: {lines}行目のチャンクの登録に失敗しました: {result}")
+            errors.append({"lines": lines, "error": str(result) or type(result).__name__})
+
+    seconds = time.perf_counter() - started
+    stats = {
+        "received": received,
+        "inserted": inserted,
+        "rejected": rejected,
+        "failed": failed,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(inserted / seconds, 1) if seconds > 0 else 0.0,
+    }
+    logger.info(f"一括登録: {inserted}件 / {stats['seconds']}秒 ({stats['rows_per_sec']} rows/s)")
+    return stats
+
+
+def export_lines(pages, format: str = "ndjson"):
+    """ページ単位のイテレータを NDJSON / CSV の文字列として順に返す"""
+    started = time.perf_counter()
+    count = 0
+    if format == "csv":
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        yield out.getvalue()
+    for rows in pages:
+        if not rows:
+            continue
+        count += len(rows)
+        if format == "csv":
+            out = io.StringIO()
+            csv.DictWriter(out, fieldnames=EXPORT_FIELDS, extrasaction="ignore").writerows(rows)
+            yield out.getvalue()
+        else:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    seconds = time.perf_counter() - started
+    logger.info(f"エクスポート: {count}件 / {seconds:.3f}秒 ({count / seconds if seconds else 0:.1f} rows/s)")
@@ -0,0 +1,51 @@
+# backend/category_stats.py
+import os, time, threading, logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# 他のワーカーでの追加を取り込むため、この秒数ごとに集計関数から読み直す
+CATEGORY_REFRESH_SECONDS = float(os.getenv("CATEGORY_REFRESH_SECONDS", "300"))
+
+
+class CategoryCounts:
+    """カテゴリごとの件数をプロセス内で保持し、追加のたびに増分更新する"""
+
+    def __init__(self, refresh_seconds: float = CATEGORY_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self.loaded_at = 0.0
+
+    def load(self, counts: dict) -> None:
+        with self._lock:
+            self._counts = Counter({k: v for k, v in counts.items() if k and v > 0})
+            self.loaded_at = time.monotonic()
+
+    def add(self, category: str, n: int = 1) -> None:
+        if not category:
+            return
+        with self._lock:
+            self._counts[category] += n
+
+    def stale(self) -> bool:
+        return time.monotonic() - self.loaded_at >= self.refresh_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(sorted(self._counts.items()))
+        return {"categories": list(counts), "counts": counts}
+
+
+def fetch_category_counts(supabase) -> dict:
+    """集計関数 excuse_category_counts から件数を取得する
+
+    関数が未作成の環境では category 列だけを1回読み込んで数える。
+    """
+    try:
+        response = supabase.rpc("excuse_category_counts", {}).execute()
+        return {row["category"]: int(row["count"]) for row in response.data}
+    except Exception as e:
+        logger.warning(f"excuse_category_counts が使えないため全件から集計します: {e}")
+        response = supabase.table("excuses").select("category").execute()
+        return dict(Counter(item["category"] for item in response.data))
@@ -0,0 +1,35 @@
+# backend/db.py
+import os, time, asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import DB_LATENCY, DB_TIMEOUTS
+
+# supabase-py の execute() は同期I/Oなので、専用の上限付きスレッドプールで実行する
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "16"))
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "10"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="db")
+
+
+class QueryTimeout(Exception):
+    """DB 呼び出しが DB_QUERY_TIMEOUT 秒以内に終わらなかったことを表す例外"""
+
+
+async def run_query(fn, *args, timeout: float = DB_QUERY_TIMEOUT):
+    """同期の DB 呼び出し fn(*args) をイベントループを塞がずに実行する"""
+    loop = asyncio.get_running_loop()
+    operation = getattr(fn, "__name__", "query")
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(_executor, fn, *args), timeout)
+    except asyncio.TimeoutError:
+        DB_TIMEOUTS.labels(operation).inc()
+        raise QueryTimeout(f"DB 呼び出しが {timeout} 秒でタイムアウトしました")
+    finally:
+        DB_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+
+def client_options():
+    """HTTP レベルでも同じタイムアウトを掛ける（スレッドが居座り続けないように）"""
+    from supabase.lib.client_options import ClientOptions
+    return ClientOptions(postgrest_client_timeout=DB_QUERY_TIMEOUT)
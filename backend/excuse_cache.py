@@ -0,0 +1,96 @@
+# backend/excuse_cache.py
+import os, time, random, threading, unicodedata
+from collections import OrderedDict
+
+CACHE_MAX_KEYS = int(os.getenv("EXCUSE_CACHE_MAX_KEYS", "1024"))
+CACHE_TTL = float(os.getenv("EXCUSE_CACHE_TTL", "3600"))
+CACHE_VARIANTS = int(os.getenv("EXCUSE_CACHE_VARIANTS", "3"))
+
+
+def normalize_detail(detail: str) -> str:
+    """全角/半角の揺れ（NFKC）と空白の違いを吸収した detail を返す"""
+    text = unicodedata.normalize("NFKC", detail or "")
+    return " ".join(text.split())
+
+
+def request_key(minutes: str, cause: str, target: str, detail: str) -> tuple:
+    """ExcuseReq 相当の入力からキャッシュ/集約用のキーを作る"""
+    return (
+        (minutes or "").strip(),
+        (cause or "").strip(),
+        (target or "").strip(),
+        normalize_detail(detail),
+    )
+
+
+class ExcuseCache:
+    """LRU + TTL の応答キャッシュ。1キーにつき数件のバリエーションを保持する。
+
+    バリエーションが ``variants`` 件たまるまではミス扱いにしてモデルに問い合わせ、
+    たまった後はその中からランダムに返す。
+    """
+
+    def __init__(self, max_keys: int = CACHE_MAX_KEYS, ttl: float = CACHE_TTL,
+                 variants: int = CACHE_VARIANTS):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self._data: OrderedDict[tuple, list[tuple[float, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _live(self, key: tuple, now: float) -> list[tuple[float, str]]:
+        # 期限切れのバリエーションを落とし、空になったキーは削除する
+        entries = [e for e in self._data.get(key, ()) if e[0] > now]
+        if entries:
+            self._data[key] = entries
+        else:
+            self._data.pop(key, None)
+        return entries
+
+    def get(self, key: tuple) -> str | None:
+        now = time.monotonic()
+        with self._lock:
+            entries = self._live(key, now)
+            if len(entries) < self.variants:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return random.choice(entries)[1]
+
+    def put(self, key: tuple, text: str) -> None:
+        if not text:
+            return
+        now = time.monotonic()
+        with self._lock:
+            entries = self._live(key, now)
+            if text in (t for _, t in entries):
+                return
+            entries.append((now + self.ttl, text))
+            # 上限を超えたら古いバリエーションから捨てる
+            self._data[key] = entries[-self.variants:]
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "keys": len(self._data),
+                "max_keys": self.max_keys,
+                "ttl": self.ttl,
+                "variants": self.variants,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,121 @@
+# backend/excuse_pool.py
+import os, asyncio, logging
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+POOL_ENABLED = os.getenv("EXCUSE_POOL_ENABLED", "1") == "1"
+POOL_SIZE = int(os.getenv("EXCUSE_POOL_SIZE", "3"))
+POOL_RPM = float(os.getenv("EXCUSE_POOL_RPM", "10"))
+POOL_BATCH = int(os.getenv("EXCUSE_POOL_BATCH", "3"))
+POOL_BUSY_INFLIGHT = int(os.getenv("EXCUSE_POOL_BUSY_INFLIGHT", "1"))
+
+# 画面のボタンと同じ選択肢（detail が空のときの入力空間）
+MINUTES = ("", "3", "5", "10", "15", "30", "60")
+CAUSES = ("", "寝坊", "予定が長引いた", "電車遅延", "バス遅延", "体調不良")
+TARGETS = ("", "上司", "同僚", "友達", "先輩", "家族", "先生(教授)", "バイト先")
+
+
+def all_keys() -> list[tuple]:
+    return [(m, c, t, "") for m in MINUTES for c in CAUSES for t in TARGETS]
+
+
+class PregenPool:
+    """detail が空の組み合わせごとに生成済みの言い訳を貯めておくプール。
+
+    バックグラウンドのワーカーが、空いている時間に需要の多い組み合わせから順に
+    rpm（1分あたりのモデル呼び出し数）の範囲で補充する。
+    """
+
+    def __init__(self, generate, busy=lambda: False, size: int = POOL_SIZE, rpm: float = POOL_RPM,
+                 batch: int = POOL_BATCH):
+        self.generate = generate  # async (key, n) -> list[str]
+        self.busy = busy
+        self.size = size
+        self.rpm = rpm
+        self.batch = max(1, batch)
+        self._pools: dict[tuple, deque[str]] = {key: deque() for key in all_keys()}
+        self.demand: Counter = Counter()
+        self._task: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+        self.calls = 0
+        self.failures = 0
+
+    def take(self, key: tuple) -> str | None:
+        pool = self._pools.get(key)
+        if pool is not None:
+            # 選択肢にない組み合わせは数えない（需要表を有限に保つ）
+            self.demand[key] += 1
+        if pool:
+            self.hits += 1
+            return pool.popleft()
+        self.misses += 1
+        return None
+
+    def _next_key(self) -> tuple | None:
+        # 足りていない組み合わせのうち、需要が最も多いもの（一度も求められていないものは補充しない）
+        best, best_demand = None, 0
+        for key, pool in self._pools.items():
+            if len(pool) < self.size and self.demand[key] > best_demand:
+                best, best_demand = key, self.demand[key]
+        return best
+
+    async def refill_once(self) -> bool:
+        key = self._next_key()
+        if key is None:
+            return False
+        pool = self._pools[key]
+        self.calls += 1
+        texts = await self.generate(key, min(self.batch, self.size - len(pool)))
+        for text in texts:
+            if len(pool) < self.size and text not in pool:
+                pool.append(text)
+        return True
+
+    async def run(self) -> None:
+        interval = 60.0 / self.rpm
+        while True:
+            await asyncio.sleep(interval)
+            if self.busy():
+                continue
+            try:
+                await self.refill_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 失敗時は本番リクエストの邪魔をしないよう長めに休む
+                self.failures += 1
+                logger.warning(f"プール補充に失敗しました: {e}")
+                await asyncio.sleep(interval * 4)
+
+    def start(self) -> None:
+        if self._task is None and self.rpm > 0:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        filled = sum(1 for pool in self._pools.values() if len(pool) >= self.size)
+        total = self.hits + self.misses
+        return {
+            "running": self._task is not None,
+            "combinations": len(self._pools),
+            "filled": filled,
+            "pooled": sum(len(pool) for pool in self._pools.values()),
+            "size": self.size,
+            "rpm": self.rpm,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "calls": self.calls,
+            "failures": self.failures,
+            "top_demand": [{"key": list(k[:3]), "count": n} for k, n in self.demand.most_common(5)],
+        }
@@ -0,0 +1,27 @@
+# backend/excuse_rules.py
+import re, unicodedata
+
+POLITE_TARGETS = ("上司", "同僚", "先輩", "先生(教授)", "バイト先")
+CASUAL_TARGETS = ("友達", "家族")
+
+# 追加説明に含まれる時間表現（例: 20分, 1時間, 一時間, 半）
+TIME_EXPR = re.compile(r"(\d+\s*分|\d+\s*時間|[一二三]時間|半時間|\d+\s*min)")
+
+
+def minutes_label(minutes: str) -> str:
+    """minutes の表示ラベル。未選択なら空文字"""
+    if minutes == "60":
+        return "一時間"
+    return f"{minutes}分" if minutes else ""
+
+
+def tone_for(target: str) -> str:
+    if target in POLITE_TARGETS:
+        return "丁寧"
+    return "カジュアル" if target in CASUAL_TARGETS else "ニュートラル"
+
+
+def time_expression(detail: str) -> str:
+    """追加説明に書かれた時間表現（なければ空文字）"""
+    m = TIME_EXPR.search(unicodedata.normalize("NFKC", detail or ""))
+    return m.group(1).replace(" ", "") if m else ""
@@ -0,0 +1,98 @@
+# backend/excuse_store.py
+import time, itertools, threading
+
+
+class ExcuseRecord:
+    """言い訳1件（100万件規模でもメモリを抑えるため __slots__ を使う）"""
+
+    __slots__ = ("id", "title", "description", "category")
+
+    def __init__(self, id: int, title: str, description: str, category: str):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.category = category
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "category": self.category,
+        }
+
+
+class ExcuseStore:
+    """id→レコードとカテゴリ→id集合の索引を持つプロセス内ストア
+
+    参照は索引から O(1) で行い、追加はロックの内側で採番と索引更新をまとめて行う。
+    """
+
+    def __init__(self, rows=()):
+        self._by_id: dict[int, ExcuseRecord] = {}
+        self._by_category: dict[str, set[int]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self.version = 0
+        self.updated_at = time.time()
+        for row in rows:
+            self._insert(ExcuseRecord(row["id"], row.get("title", ""), row["description"], row.get("category", "")))
+        if self._by_id:
+            self._last_id = max(self._by_id)
+            self._ids = itertools.count(self._last_id + 1)
+
+    def _insert(self, record: ExcuseRecord) -> None:
+        self._by_id[record.id] = record
+        self._last_id = max(self._last_id, record.id)
+        if record.category:
+            self._by_category.setdefault(record.category, set()).add(record.id)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, excuse_id: int) -> ExcuseRecord | None:
+        return self._by_id.get(excuse_id)
+
+    def all(self) -> list[dict]:
+        # dict は挿入順（= id 昇順）を保つ
+        return [record.to_dict() for record in list(self._by_id.values())]
+
+    def page(self, after: int, limit: int) -> list[dict]:
+        """id > after を id 昇順に最大 limit 件（採番は連番なので O(limit)）"""
+        rows = []
+        for excuse_id in range(max(after, 0) + 1, self._last_id + 1):
+            record = self._by_id.get(excuse_id)
+            if record is not None:
+                rows.append(record.to_dict())
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def create(self, title: str, description: str, category: str) -> ExcuseRecord:
+        with self._lock:
+            record = ExcuseRecord(next(self._ids), title, description, category)
+            self._insert(record)
+            self.version += 1
+            self.updated_at = time.time()
+        return record
+
+    def create_many(self, rows: list[dict]) -> list[ExcuseRecord]:
+        """複数件をロック1回で追加する（一括登録用）"""
+        with self._lock:
+            records = [ExcuseRecord(next(self._ids), row.get("title", ""), row["description"], row.get("category", ""))
+                       for row in rows]
+            for record in records:
+                self._insert(record)
+            self.version += 1
+            self.updated_at = time.time()
+        return records
+
+    def categories(self) -> list[str]:
+        return sorted(self._by_category)
+
+    def category_counts(self) -> dict:
+        return {category: len(self._by_category[category]) for category in self.categories()}
+
+    def category_ids(self, category: str) -> set[int]:
+        return self._by_category.get(category, set())
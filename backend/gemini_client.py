@@ -1,82 +1,378 @@
 # backend/gemini_client.py
-import os, time, random
-from dotenv import load_dotenv
+import os, time, random, asyncio, json, logging, unicodedata
 
-load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+from typing import TYPE_CHECKING
 
-from google import genai
-from google.genai import types
+import settings  # noqa: F401  (.env の読み込み)
+from resilience import CircuitBreaker, RetryBudget, classify_error
+from metrics import (GEMINI_ATTEMPT_LATENCY, GEMINI_EMPTY, GEMINI_ERRORS, GEMINI_IN_FLIGHT, GEMINI_RETRIES,
+                     GEMINI_TRANSIENT)
+from prompts import Prompt, TokenUsage, get_template
+from model_router import ModelRouter
+from key_pool import KeyPool, configured_keys
 
-MODEL_ID = "gemini-1.5-flash"
+if TYPE_CHECKING:
+    from google.genai import types
+
+BATCH_MODE = os.getenv("EXCUSE_BATCH_MODE", "json")  # json | candidates
+# 起動時に全キーのクライアントを作り、モデルへの接続を開いておく（EXCUSE_PREWARM=1）
+PREWARM_TIMEOUT = float(os.getenv("EXCUSE_PREWARM_TIMEOUT", "5"))
+
+logger = logging.getLogger(__name__)
 
 class TransientAIError(Exception):
     """503 など一時的な障害を表す例外"""
 
+class CircuitOpenError(TransientAIError):
+    """サーキットブレーカーが開いていて呼び出しを行わなかったことを表す例外"""
+
+class EmptyResponseError(RuntimeError):
+    """モデルの応答が空だったことを表す例外（恒久的エラー扱い）"""
+
+async def _aclose(stream) -> None:
+    """ストリームの応答を途中で閉じる（閉じられない実装・閉じるときのエラーは無視する）"""
+    close = getattr(stream, "aclose", None)
+    if close is None:
+        return
+    try:
+        await close()
+    except Exception:
+        pass
+
 class GeminiClient:
     def __init__(self, api_key: str | None = None):
-        key = api_key or os.getenv("GOOGLE_API_KEY")
-        if not key:
-            raise RuntimeError("GOOGLE_API_KEY が設定されていません（backend/.env）")
-        self.client = genai.Client(api_key=key)
-
-    def _call_once(self, system: str, user: str) -> str:
-        resp = self.client.models.generate_content(
-            model=MODEL_ID,
-            contents=[system, user],
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-                max_output_tokens=60,
-            ),
-        )
+        # GOOGLE_API_KEYS があればキーごとにクライアントを作って振り分ける
+        # （google.genai の読み込みとクライアントの生成は最初の呼び出しか prewarm まで遅らせる）
+        keys = [(api_key, 1.0)] if api_key else configured_keys()
+        self.keys = KeyPool(keys, self._make_client)
+        # プロセス内で1つの GeminiClient を共有する前提で、障害状態と再試行予算もここで持つ
+        self.breaker = CircuitBreaker()
+        self.retry_budget = RetryBudget()
+        self.errors: dict[str, int] = {}
+        self.in_flight = 0
+        self.template = get_template()
+        self.usage = TokenUsage()
+        self.router = ModelRouter()
+        self._configs: dict[tuple, "types.GenerateContentConfig"] = {}
+
+    @staticmethod
+    def _make_client(key: str):
+        from google import genai
+        return genai.Client(api_key=key)
+
+    async def aprewarm(self) -> None:
+        """全キーのクライアントを作り、モデル情報の取得で接続（DNS/TLS）を開いておく。失敗しても起動は止めない"""
+        if not self.keys.keys:
+            logger.warning("prewarm: API キーが設定されていません")
+            return
+        model = self.router.routes[0].name
+
+        async def warm(key):
+            try:
+                await asyncio.wait_for(key.client.aio.models.get(model=model), PREWARM_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"prewarm に失敗しました（{key.label}）: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(warm(key) for key in self.keys.keys))
+        self._config(self._build_prompt("", "", "", ""), 0.7)
+        logger.info(f"prewarm: {len(self.keys.keys)}キー {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def _config(self, prompt: Prompt, temperature: float, **extra) -> "types.GenerateContentConfig":
+        # system_instruction と上限が同じなら設定オブジェクトを使い回す
+        key = (prompt.version, prompt.max_output_tokens, temperature, tuple(extra.items()))
+        config = self._configs.get(key)
+        if config is None:
+            from google.genai import types
+            config = types.GenerateContentConfig(
+                system_instruction=prompt.system,
+                temperature=temperature,
+                max_output_tokens=prompt.max_output_tokens,
+                **extra,
+            )
+            if len(self._configs) >= 256:
+                self._configs.clear()
+            self._configs[key] = config
+        return config
+
+    def _record(self, prompt: Prompt, key, resp) -> None:
+        self.usage.record(prompt.version, resp)
+        self.keys.record_usage(key, resp)
+
+    def _call_once(self, model: str, prompt: Prompt) -> str:
+        with self.keys.lease() as key:
+            resp = key.client.models.generate_content(
+                model=model,
+                contents=prompt.user,
+                config=self._config(prompt, 0.7),
+            )
+        self._record(prompt, key, resp)
+        return (getattr(resp, "text", "") or "").strip()
+
+    async def _acall_once(self, model: str, prompt: Prompt) -> str:
+        with self.keys.lease() as key:
+            resp = await key.client.aio.models.generate_content(
+                model=model,
+                contents=prompt.user,
+                config=self._config(prompt, 0.7),
+            )
+        self._record(prompt, key, resp)
         return (getattr(resp, "text", "") or "").strip()
 
+    def _build_prompt(self, minutes: str, cause: str, target: str, detail: str) -> Prompt:
+        return self.template.render(minutes, cause, target, detail)
+
+    @staticmethod
+    def _is_transient(e: Exception) -> bool:
+        return classify_error(e) != "permanent"
+
+    @staticmethod
+    def _backoff(i: int) -> float:
+        # 指数バックオフ＋ジッター（0.3〜）
+        return (2 ** i) + random.uniform(0.3, 0.9)
+
     def generate_excuse(self, minutes: str, cause: str, target: str, detail: str) -> str:
-        # 時間の表記
-        if minutes == "60":
-            time_jp = "一時間"
-        elif minutes:
-            time_jp = f"{minutes}分"
-        else:
-            time_jp = "未選択"
+        prompt = self._build_prompt(minutes, cause, target, detail)
+        return self._retry(lambda model: self._call_once(model, prompt))
 
+    def _begin(self) -> None:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Gemini への呼び出しを一時停止しています（サーキットオープン）")
+        self.retry_budget.record_call()
 
-        polite_targets = ("上司", "同僚", "先輩", "先生(教授)", "バイト先")
-        casual_targets = ("友達", "家族")
-        tone = "丁寧" if target in polite_targets else ("カジュアル" if target in casual_targets else "ニュートラル")
+    def _next_wait(self, e: Exception, i: int, attempts: int) -> float | None:
+        """失敗を記録し、再試行するなら待ち秒数、しないなら None を返す"""
+        kind = classify_error(e)
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+        GEMINI_ERRORS.labels(kind).inc()
+        if kind == "permanent":
+            # 応答は返ってきているのでブレーカー上は成功扱い
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        if i < attempts - 1 and self.breaker.allow() and self.retry_budget.try_retry():
+            GEMINI_RETRIES.labels(kind).inc()
+            return self._backoff(i)
+        return None
 
-        system = (
-          "あなたは日本語で、LINE/SMS向けの短い遅刻連絡文を書くアシスタントです。"
-          "出力は1〜3文、絵文字や顔文字は使わないでください。追加説明に文章の長さが指定されていた場合、5文まで可能です。"
-          "minutes_selected が false であり、追加説明に時間表現がない場合、数値の時間表現（例: 3分, 10分, 一時間 など）を絶対に出力してはいけません。"
-          "その場合は『少し』『少々』『まもなく』などの非数値の表現のみを使ってください。"
-          "minutes_selected が true のときは minutes_label の値（例: 3分/5分/…/一時間）をそのまま使い、変更しないでください。"
-          "対象に応じて文体を切り替えてください：上司/同僚/先輩→丁寧、友達/家族→カジュアル。"
-          "原因と追加説明に別の内容が書かれていた場合、その両方の内容を文章に含めてください。"
-        )
+    @staticmethod
+    def _observe(started: float, e: Exception | None) -> None:
+        """1回の呼び出しの所要時間を結果（ok / 空 / 失敗の種類）別に記録する"""
+        if e is None:
+            outcome = "ok"
+        elif isinstance(e, EmptyResponseError):
+            outcome = "empty"
+        else:
+            outcome = classify_error(e)
+        GEMINI_ATTEMPT_LATENCY.labels(outcome).observe(time.perf_counter() - started)
 
-        user = (
-            f"到着まで:{time_jp} / 原因:{cause or '未選択'} / 相手:{target or '未選択'} / 追加説明:{detail or 'なし'}\n"
-            f"文体:{tone}。自然な日本語で1~3文程度の言い訳を書いてください。"
-        )
+    def _retry(self, call):
+        # 一時エラーは指数バックオフで最大4回まで再試行（ブレーカーと再試行予算の範囲内）
+        self._begin()
+        self.in_flight += 1
+        GEMINI_IN_FLIGHT.inc()
+        try:
+            return self._retry_loop(call)
+        finally:
+            self.in_flight -= 1
+            GEMINI_IN_FLIGHT.dec()
 
-        # 503 などの一時エラーは指数バックオフで最大4回まで再試行
+    def _retry_loop(self, call):
         attempts = 4
         for i in range(attempts):
+            started = time.perf_counter()
             try:
-                text = self._call_once(system, user)
-                if not text:
+                result = self.router.call(call, i)
+                if not result:
                     # 応答が空なら恒久的エラーとして扱う
-                    raise RuntimeError("空の応答")
-                return text
+                    GEMINI_EMPTY.inc()
+                    raise EmptyResponseError("空の応答")
+                self._observe(started, None)
+                self.breaker.record_success()
+                return result
             except Exception as e:
-                msg = str(e)
-                # エラーメッセージ内の 503/UNAVAILABLE/overloaded を簡易判定
-                transient = ("503" in msg) or ("UNAVAILABLE" in msg.upper()) or ("overloaded" in msg.lower())
-                if transient and i < attempts - 1:
-                    # 指数バックオフ＋ジッター（0.3〜）
-                    wait = (2 ** i) + random.uniform(0.3, 0.9)
+                self._observe(started, e)
+                wait = self._next_wait(e, i, attempts)
+                if wait is not None:
                     time.sleep(wait)
                     continue
-                if transient:
-                    raise TransientAIError(msg)
-                raise  # 恒久的エラーは即時伝播
\ No newline at end of file
+                if self._is_transient(e):
+                    GEMINI_TRANSIENT.inc()
+                    raise TransientAIError(str(e)) from e
+                raise  # 恒久的エラーは即時伝播
+
+    async def _acall_candidates(self, model: str, prompt: Prompt, n: int) -> list[str]:
+        with self.keys.lease() as key:
+            resp = await key.client.aio.models.generate_content(
+                model=model,
+                contents=prompt.user,
+                config=self._config(prompt, 0.9, candidate_count=n),
+            )
+        self._record(prompt, key, resp)
+        texts = []
+        for cand in getattr(resp, "candidates", None) or []:
+            parts = getattr(getattr(cand, "content", None), "parts", None) or []
+            texts.append("".join(getattr(p, "text", "") or "" for p in parts))
+        return self._dedupe(texts)
+
+    async def _acall_json_list(self, model: str, prompt: Prompt, n: int) -> list[str]:
+        with self.keys.lease() as key:
+            resp = await key.client.aio.models.generate_content(
+                model=model,
+                contents=prompt.user,
+                config=self._config(prompt, 0.9, response_mime_type="application/json", response_schema=list[str]),
+            )
+        self._record(prompt, key, resp)
+        raw = (getattr(resp, "text", "") or "").strip()
+        try:
+            items = json.loads(raw)
+        except ValueError:
+            items = self._partial_json_list(raw)
+        if not isinstance(items, list):
+            items = [items]
+        return self._dedupe([i for i in items if isinstance(i, str)])[:n]
+
+    @staticmethod
+    def _partial_json_list(raw: str) -> list[str]:
+        """途中で切れた JSON 配列から、閉じている文字列要素だけを取り出す（最後の閉じていない要素は捨てる）"""
+        decoder = json.JSONDecoder()
+        items, pos = [], raw.find("[") + 1
+        while pos:
+            while pos < len(raw) and raw[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(raw) or raw[pos] != '"':
+                break
+            try:
+                item, pos = decoder.raw_decode(raw, pos)
+            except ValueError:
+                break
+            items.append(item)
+        return items
+
+    @staticmethod
+    def _dedupe(texts: list[str]) -> list[str]:
+        # 全角/半角・空白の違いだけの重複は1件にまとめる
+        seen, result = set(), []
+        for text in texts:
+            text = (text or "").strip()
+            norm = "".join(unicodedata.normalize("NFKC", text).split())
+            if norm and norm not in seen:
+                seen.add(norm)
+                result.append(text)
+        return result
+
+    async def _aretry(self, call, discard=None):
+        # _retry の asyncio 版（待機は asyncio.sleep）
+        self._begin()
+        self.in_flight += 1
+        GEMINI_IN_FLIGHT.inc()
+        try:
+            return await self._aretry_loop(call, discard)
+        except asyncio.CancelledError:
+            # キャンセルでは成功・失敗が記録されないので、ハーフオープンの試行枠をここで返す
+            self.breaker.release_probe()
+            raise
+        finally:
+            self.in_flight -= 1
+            GEMINI_IN_FLIGHT.dec()
+
+    async def _aretry_loop(self, call, discard=None):
+        attempts = 4
+        for i in range(attempts):
+            started = time.perf_counter()
+            try:
+                result = await self.router.acall(call, i, discard)
+                if not result:
+                    GEMINI_EMPTY.inc()
+                    raise EmptyResponseError("空の応答")
+                self._observe(started, None)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                self._observe(started, e)
+                wait = self._next_wait(e, i, attempts)
+                if wait is not None:
+                    await asyncio.sleep(wait)
+                    continue
+                if self._is_transient(e):
+                    GEMINI_TRANSIENT.inc()
+                    raise TransientAIError(str(e)) from e
+                raise
+
+    def resilience_stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.retry_budget.stats(),
+            "errors": dict(self.errors),
+        }
+
+    def key_stats(self) -> dict:
+        return self.keys.stats()
+
+    def routing_stats(self) -> dict:
+        return self.router.stats()
+
+    def usage_stats(self) -> dict:
+        return {"prompt_version": self.template.version, "tokens": self.usage.stats()}
+
+    async def agenerate_excuse(self, minutes: str, cause: str, target: str, detail: str) -> str:
+        """generate_excuse の asyncio 版。待機中もイベントループを塞がない"""
+        prompt = self._build_prompt(minutes, cause, target, detail)
+        return await self._aretry(lambda model: self._acall_once(model, prompt))
+
+    async def agenerate_candidates(self, minutes: str, cause: str, target: str, detail: str,
+                                   n: int) -> list[str]:
+        """1回のリクエストで candidate_count=n の候補を取り、重複を除いて返す"""
+        prompt = self._build_prompt(minutes, cause, target, detail)
+        return await self._aretry(lambda model: self._acall_candidates(model, prompt, n))
+
+    async def agenerate_excuses(self, minutes: str, cause: str, target: str, detail: str,
+                                n: int) -> list[str]:
+        """1回のモデル呼び出しで最大 n 件の異なる言い訳を返す（EXCUSE_BATCH_MODE で方式を選択）"""
+        if BATCH_MODE == "candidates":
+            return await self.agenerate_candidates(minutes, cause, target, detail, n)
+        prompt = self.template.render_batch(minutes, cause, target, detail, n)
+        return await self._aretry(lambda model: self._acall_json_list(model, prompt, n))
+
+    async def astream_excuse(self, minutes: str, cause: str, target: str, detail: str):
+        """generateContentStream で生成し、テキスト断片を順に返す非同期ジェネレータ。
+
+        一時エラーの再試行は最初の断片を受け取るまでの間だけ行う。
+        """
+        prompt = self._build_prompt(minutes, cause, target, detail)
+
+        async def open_stream(model: str):
+            # キーの処理中の数は最初の断片を受け取るまでを数える
+            with self.keys.lease() as key:
+                stream = await key.client.aio.models.generate_content_stream(
+                    model=model,
+                    contents=prompt.user,
+                    config=self._config(prompt, 0.7),
+                )
+                try:
+                    async for chunk in stream:
+                        text = getattr(chunk, "text", "") or ""
+                        if text:
+                            return stream, key, chunk, text
+                except BaseException:
+                    # ヘッジに負けてキャンセルされたときも接続を閉じる
+                    await _aclose(stream)
+                    raise
+            return None
+
+        async def discard(opened):
+            # ヘッジで同じ回に両方開けたとき、使わない方のストリームを閉じる
+            await _aclose(opened[0])
+
+        stream, key, last, first = await self._aretry(open_stream, discard)
+        try:
+            yield first
+            async for chunk in stream:
+                last = chunk
+                text = getattr(chunk, "text", "") or ""
+                if text:
+                    yield text
+        finally:
+            # 呼び出し側が途中でやめたときも接続を閉じる。usage_metadata は最後の断片に累計値が入る
+            await _aclose(stream)
+            self._record(prompt, key, last)
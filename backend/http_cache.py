@@ -0,0 +1,45 @@
+# backend/http_cache.py
+import json, hashlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+
+def etag_for(payload) -> str:
+    """JSON化した内容から強い ETag を作る"""
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return '"' + hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest() + '"'
+
+
+def _not_modified(request: Request, etag: str, last_modified: float | None) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        # If-None-Match がある場合は If-Modified-Since より優先（RFC 9110）
+        tags = [t.strip().removeprefix("W/") for t in inm.split(",")]
+        return "*" in tags or etag in tags
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_json(request: Request, payload, last_modified: float | None = None,
+                     etag: str | None = None) -> Response:
+    """ETag / Last-Modified 付きで返し、条件付きGETが一致すれば 304 を返す
+
+    etag を渡した場合は本文のハッシュ計算を省く（payload は呼び出し可能でもよく、
+    304 のときは組み立てない）。
+    """
+    if etag is None:
+        payload = payload() if callable(payload) else payload
+        etag = etag_for(payload)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload() if callable(payload) else payload, headers=headers)
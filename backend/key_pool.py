@@ -0,0 +1,145 @@
+# backend/key_pool.py
+import os, time, hashlib, threading
+from contextlib import contextmanager
+
+from prometheus_client import Counter
+
+from resilience import classify_error
+
+# 一時障害（429/503 など）が出たキーを外しておく秒数。連続するたびに倍にする
+KEY_BACKOFF_SECONDS = float(os.getenv("GEMINI_KEY_BACKOFF_SECONDS", "10"))
+KEY_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_KEY_BACKOFF_MAX_SECONDS", "300"))
+# 認証エラー（401/403）のキーは長めに外す
+KEY_AUTH_BACKOFF_SECONDS = float(os.getenv("GEMINI_KEY_AUTH_BACKOFF_SECONDS", "600"))
+
+KEY_CALLS = Counter("excuse_gemini_key_calls_total", "API キーごとの呼び出し数", ("key", "outcome"))
+
+
+def parse_keys(value: str) -> list[tuple[str, float]]:
+    """GOOGLE_API_KEYS（"key1,key2:2,key3:0.5"）を (キー, 重み) の一覧にする"""
+    keys = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, _, weight = item.partition(":")
+        keys.append((key.strip(), float(weight) if weight.strip() else 1.0))
+    return keys
+
+
+def configured_keys() -> list[tuple[str, float]]:
+    keys = parse_keys(os.getenv("GOOGLE_API_KEYS", ""))
+    if not keys and os.getenv("GOOGLE_API_KEY"):
+        keys = [(os.getenv("GOOGLE_API_KEY"), 1.0)]
+    return keys
+
+
+class ApiKey:
+    """1キー分のクライアントと利用状況（キーそのものは統計に出さない）"""
+
+    def __init__(self, make_client, key: str, weight: float = 1.0):
+        self._make_client = make_client
+        self._key = key
+        self._client = None
+        self.label = "key-" + hashlib.blake2b(key.encode(), digest_size=4).hexdigest()
+        self.weight = max(weight, 0.01)
+        self.in_flight = 0
+        self.calls = 0
+        self.tokens = 0
+        self.errors: dict[str, int] = {}
+        self._failures = 0
+        self._down_until = 0.0
+
+    @property
+    def client(self):
+        # クライアントは最初に使うときに作る
+        if self._client is None:
+            self._client = self._make_client(self._key)
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+
+    def load(self) -> tuple[float, float]:
+        # 処理中の数を重みで割った値が小さい順、同じなら累計の少ない順（重み付きラウンドロビン）
+        return (self.in_flight + 1) / self.weight, self.calls / self.weight
+
+    def stats(self) -> dict:
+        return {
+            "weight": self.weight,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "tokens": self.tokens,
+            "errors": dict(self.errors),
+            "backoff": round(max(0.0, self._down_until - time.monotonic()), 3),
+        }
+
+
+class KeyPool:
+    """複数の API キー（プロジェクト）に呼び出しを振り分ける
+
+    空いているキーのうち負荷の低いものを選び、429/503 などを返したキーは一定時間外す。
+    全キーが外れているときは、最も早く戻るキーを使う。
+    """
+
+    def __init__(self, keys: list[tuple[str, float]], make_client):
+        # キーがなくても生成以外のルート（CRUD・検索）は動かせるよう、確認は最初のモデル呼び出しまで遅らせる
+        self.keys = [ApiKey(make_client, key, weight) for key, weight in keys]
+        self._lock = threading.Lock()
+
+    def pick(self) -> ApiKey:
+        if not self.keys:
+            raise RuntimeError("GOOGLE_API_KEY（または GOOGLE_API_KEYS）が設定されていません（backend/.env）")
+        now = time.monotonic()
+        with self._lock:
+            ready = [k for k in self.keys if k._down_until <= now]
+            if not ready:
+                return min(self.keys, key=lambda k: k._down_until)
+            return min(ready, key=ApiKey.load)
+
+    @contextmanager
+    def lease(self):
+        """選んだキーを処理中として数え、結果に応じて外す・戻す"""
+        key = self.pick()
+        with self._lock:
+            key.in_flight += 1
+            key.calls += 1
+        try:
+            yield key
+        except Exception as e:
+            self._failed(key, e)
+            raise
+        else:
+            with self._lock:
+                key._failures = 0
+            KEY_CALLS.labels(key.label, "ok").inc()
+        finally:
+            with self._lock:
+                key.in_flight -= 1
+
+    def _failed(self, key: ApiKey, e: Exception) -> None:
+        kind = classify_error(e)
+        if kind == "permanent" and getattr(e, "code", None) in (401, 403):
+            kind, backoff = "auth", KEY_AUTH_BACKOFF_SECONDS
+        elif kind in ("rate_limited", "unavailable"):
+            backoff = min(KEY_BACKOFF_MAX_SECONDS, KEY_BACKOFF_SECONDS * 2 ** key._failures)
+        else:
+            backoff = 0.0
+        with self._lock:
+            key.errors[kind] = key.errors.get(kind, 0) + 1
+            if backoff:
+                key._failures += 1
+                key._down_until = time.monotonic() + backoff
+        KEY_CALLS.labels(key.label, kind).inc()
+
+    def record_usage(self, key: ApiKey, resp) -> None:
+        usage = getattr(resp, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", None) or 0
+        if total:
+            with self._lock:
+                key.tokens += total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {k.label: k.stats() for k in self.keys}
@@ -0,0 +1,75 @@
+# backend/local_excuse.py
+import zlib
+
+from excuse_rules import minutes_label, time_expression, tone_for
+
+# 画面のテンプレ（index.html の TO_STYLE / CAUSE_TPL）をもとにした文面。
+# 文体は generate_excuse と同じ tone_for の分類に合わせる（POLITE_TARGETS の相手は丁寧語だけ）
+TARGET_STYLE = {
+    "上司": (("大変申し訳ありません、", "申し訳ございません、"),
+             ("到着後ただちに合流し、すぐに対応いたします。", "必要でしたら先にご指示ください。")),
+    "同僚": (("すみません、", "申し訳ありません、"),
+             ("先に進められるところだけお願いします。", "到着後に巻き返します。")),
+    "友達": (("ごめん！", "ごめん、"),
+             ("先に入ってて！", "待たせてごめん！")),
+    "先輩": (("申し訳ありません、", "すみません、"),
+             ("到着し次第すぐにご挨拶に伺います。", "先に始めていただけますと助かります。")),
+    "家族": (("ごめん、", "ごめんね、"),
+             ("着いたらすぐ連絡する。", "先に始めてて大丈夫。")),
+    "先生(教授)": (("失礼いたします、", "申し訳ありません、"),
+                   ("到着し次第すぐに伺います。", "先に始めていただけますと幸いです。")),
+    "バイト先": (("申し訳ございません、", "大変申し訳ありません、"),
+                 ("到着次第ただちに業務に入ります。", "必要でしたら先にご指示をお願いいたします。")),
+}
+
+# 画面にない相手は generate_excuse と同じ文体分類で選ぶ
+TONE_STYLE = {
+    "丁寧": (("申し訳ありません、", "申し訳ございません、"),
+             ("到着し次第すぐに合流します。", "進展があればまたご連絡します。")),
+    "カジュアル": (("ごめん、", "ごめんね、"),
+                   ("着いたらすぐ連絡する。", "先に始めてて大丈夫。")),
+    "ニュートラル": (("すみません、", "申し訳ありません、"),
+                     ("到着し次第すぐに合流します。", "進展があればまたご連絡します。")),
+}
+
+CAUSE_TEMPLATES = {
+    "": ("到着が{tp}遅れます。", "現在{tp}遅れています。"),
+    "寝坊": ("寝過ごしてしまい、{tp}遅れます。", "起床が遅れており、{tp}遅れます。"),
+    "予定が長引いた": ("直前の予定が長引き、{tp}遅れます。", "前の用事が押しており、{tp}遅れます。"),
+    "電車遅延": ("電車の遅延により、{tp}遅れます。", "最寄り路線が遅延中のため、{tp}遅れます。"),
+    "バス遅延": ("バスの遅延により、{tp}遅れます。", "交通状況でバスが遅れており、{tp}遅れます。"),
+    "体調不良": ("体調が優れず、{tp}遅れます。", "急に具合が悪くなり、{tp}遅れます。"),
+}
+
+# 時間未選択かつ追加説明にも時間表現がないときは非数値の表現のみ
+VAGUE_TIMES = ("少し", "少々")
+
+
+class LocalExcuseEngine:
+    """フレーズ表から言い訳を組み立てるローカル生成器（モデル呼び出しなし・決定的）"""
+
+    variants = 2
+
+    def time_phrase(self, minutes: str, detail: str, v: int) -> str:
+        label = minutes_label(minutes) or time_expression(detail)
+        if label:
+            # ラベル自体は変更せず、概数の語だけ添える
+            return label + ("ほど" if v == 0 else "くらい")
+        return VAGUE_TIMES[v]
+
+    def generate(self, minutes: str, cause: str, target: str, detail: str, variant: int | None = None) -> str:
+        if variant is None:
+            # 同じ入力には同じ文を返す
+            variant = zlib.crc32(f"{minutes}|{cause}|{target}|{detail}".encode("utf-8"))
+        v = variant % self.variants
+
+        openers, closers = TARGET_STYLE.get(target) or TONE_STYLE[tone_for(target)]
+        body = CAUSE_TEMPLATES.get(cause, CAUSE_TEMPLATES[""])[v]
+        if cause and cause not in CAUSE_TEMPLATES:
+            body = f"{cause}のため、" + "{tp}遅れます。"
+        text = openers[v] + body.replace("{tp}", self.time_phrase(minutes, detail, v))
+
+        note = (detail or "").strip().rstrip("。.!！")
+        if note:
+            text += note + "。"
+        return text + closers[v]
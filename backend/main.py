@@ -1,20 +1,74 @@
-from fastapi import FastAPI, HTTPException
+import settings  # noqa: F401  (.env の読み込み。他のモジュールより先に import する)
+import os
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import uvicorn
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal
 from gemini_client import GeminiClient, TransientAIError
+from excuse_cache import ExcuseCache, request_key
+from similar_cache import SimilarExcuseCache
+from singleflight import SingleFlight
+from excuse_pool import PregenPool, POOL_ENABLED, POOL_BUSY_INFLIGHT
+from local_excuse import LocalExcuseEngine
+from http_cache import conditional_json
+from repository import create_repository, IndexNotReady
+from search_index import SEARCH_MAX_LIMIT
+from db import run_query, QueryTimeout
+from metrics import MetricsMiddleware, metrics_response
+from rate_limit import RATE_LIMIT_ENABLED, QuotaExceeded, RateLimiter, RateLimitMiddleware, retry_after
+from pagination import NDJSON, PAGE_DEFAULT, PAGE_MAX, wants_ndjson, next_page_headers, ndjson_response, keyset_pages
+from bulk_io import iter_records, bulk_import, export_lines
 
+logger = logging.getLogger(__name__)
+
+# 起動時にモデルへの接続を開いてからリクエストを受け付ける（コールドスタート直後の1件目を速くする）
+PREWARM = os.getenv("EXCUSE_PREWARM", "0") == "1"
+# 検索索引の読み込みに失敗したとき、次のページを読み直すまでの秒数
+INDEX_RETRY_SECONDS = float(os.getenv("SEARCH_INDEX_RETRY_SECONDS", "5"))
+
+
+async def build_index():
+    """検索索引を1ページずつ（1クエリずつタイムアウト付きで）読み込む。終わるまで検索は 503"""
+    while True:
+        try:
+            if await _db(excuses_db.sync_index_page):
+                return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"検索索引の読み込みに失敗しました: {e}")
+            await asyncio.sleep(INDEX_RETRY_SECONDS)
 
-from dotenv import load_dotenv; load_dotenv()
-import os
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await _db(excuses_db.load)
+    # 検索索引は起動を待たせずにバックグラウンドで作る（件数が多いと1回のクエリに収まらない）
+    indexer = None if excuses_db.index_ready else asyncio.create_task(build_index())
+    if PREWARM:
+        await gemini.aprewarm()
+    # 空き時間にプールを補充するワーカーを起動
+    if POOL_ENABLED:
+        pool.start()
+    yield
+    await pool.stop()
+    if indexer is not None:
+        indexer.cancel()
+        try:
+            await indexer
+        except asyncio.CancelledError:
+            pass
 
 app = FastAPI(
     title="Excuse API",
     description="ExcuseアプリケーションのバックエンドAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 class ExcuseReq(BaseModel):
@@ -22,18 +76,86 @@ class ExcuseReq(BaseModel):
     cause: str    # "寝坊" 等 or ""
     target: str   # "上司" 等 or ""
     detail: str   # テキストボックス
+    mode: Literal["local", "ai", "auto"] = "auto"  # auto: AI が使えなければローカル生成
 
 class ExcuseRes(BaseModel):
     excuse: str
+    source: str = "ai"  # "ai" | "local"
+
+class ExcusesReq(ExcuseReq):
+    count: int = Field(3, ge=1, le=8)  # 返してほしい件数
+
+class ExcusesRes(BaseModel):
+    excuses: List[str]
+
+# auto モードで AI の応答をこれ以上待たずにローカル生成へ切り替える秒数
+AI_DEADLINE = float(os.getenv("EXCUSE_AI_DEADLINE", "8"))
+# ストリームの先頭のリクエストが結果を渡さないまま終わったとき、待機者を解放するまでの秒数
+STREAM_FLIGHT_TIMEOUT = float(os.getenv("EXCUSE_STREAM_FLIGHT_TIMEOUT", "60"))
 
 gemini = GeminiClient()
+local_engine = LocalExcuseEngine()
+excuse_cache = ExcuseCache()
+similar_cache = SimilarExcuseCache()
+flight = SingleFlight()
+
+async def _pool_generate(key: tuple, n: int) -> list[str]:
+    minutes, cause, target, detail = key
+    return await gemini.agenerate_excuses(minutes, cause, target, detail, n)
+
+pool = PregenPool(_pool_generate, busy=lambda: gemini.in_flight >= POOL_BUSY_INFLIGHT)
+
+async def _generate(req: ExcuseReq, key: tuple) -> str:
+    """同じ内容の生成が進行中ならその結果を待ち、なければモデルを呼ぶ"""
+    async def call(n: int) -> list[str]:
+        # モデルのクォータ全体の枠は、実際にモデルを呼ぶ（集約の先頭の）リクエストだけが取る
+        await rate_limiter.acquire_model()
+        if n > 1:
+            texts = await gemini.agenerate_excuses(req.minutes, req.cause, req.target, req.detail, n)
+        else:
+            texts = [await gemini.agenerate_excuse(req.minutes, req.cause, req.target, req.detail)]
+        for text in texts:
+            excuse_cache.put(key, text)
+            similar_cache.put(key, text)
+        return texts
+    return await flight.do(key, call)
+
+def _local(req: ExcuseReq) -> dict:
+    return {
+        "excuse": local_engine.generate(req.minutes, req.cause, req.target, req.detail),
+        "source": "local",
+    }
 
 @app.post("/generate_excuse", response_model=ExcuseRes)
-def generate_excuse(req: ExcuseReq):
+async def generate_excuse(req: ExcuseReq):
+    if req.mode == "local":
+        return _local(req)
+    key = request_key(req.minutes, req.cause, req.target, req.detail)
+    # detail が空ならバックグラウンドで貯めたプールから即答
+    pooled = pool.take(key) if not key[3] else None
+    if pooled:
+        return {"excuse": pooled}
+    cached = excuse_cache.get(key)
+    if cached:
+        return {"excuse": cached}
+    # detail の言い回しが違うだけの過去のリクエストがあればその言い訳を使う
+    similar = similar_cache.get(key)
+    if similar:
+        return {"excuse": similar}
     try:
-        text = gemini.generate_excuse(req.minutes, req.cause, req.target, req.detail)
+        if req.mode == "auto":
+            text = await asyncio.wait_for(_generate(req, key), AI_DEADLINE)
+        else:
+            text = await _generate(req, key)
         return {"excuse": text}
-    except TransientAIError as e:
+    except QuotaExceeded:
+        if req.mode == "auto":
+            return _local(req)
+        raise
+    except (TransientAIError, asyncio.TimeoutError) as e:
+        # サーキットオープン・期限超過・一時エラーは auto ならローカル生成で返す
+        if req.mode == "auto":
+            return _local(req)
         # モデル過負荷などの一時エラーは 503
         raise HTTPException(
             status_code=503,
@@ -42,12 +164,141 @@ def generate_excuse(req: ExcuseReq):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini error: {e}")
 
+@app.post("/generate_excuses", response_model=ExcusesRes)
+async def generate_excuses(req: ExcusesReq):
+    """1回のモデル呼び出しで count 件の異なる言い訳を返す"""
+    key = request_key(req.minutes, req.cause, req.target, req.detail)
+    await rate_limiter.acquire_model()
+    try:
+        texts = await gemini.agenerate_excuses(req.minutes, req.cause, req.target, req.detail, req.count)
+    except TransientAIError:
+        raise HTTPException(
+            status_code=503,
+            detail="AIが混雑しています。しばらくしてからもう一度お試しください。"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gemini error: {e}")
+    for text in texts:
+        excuse_cache.put(key, text)
+        similar_cache.put(key, text)
+    return {"excuses": texts}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _settle(leader: asyncio.Future | None, text: str | None = None, error: Exception | None = None) -> None:
+    """ストリームの先頭のリクエストの結果を、同じ内容で待っているリクエストに渡す"""
+    if leader is None or leader.done():
+        return
+    if error is None:
+        leader.set_result([text])
+    else:
+        leader.set_exception(error)
+
+@app.post("/generate_excuse/stream")
+async def generate_excuse_stream(req: ExcuseReq):
+    """生成結果を Server-Sent Events（delta → done）で逐次返す
+
+    同じ内容の生成が進行中なら（/generate_excuse のものも含め）モデルは呼ばず、
+    その完成した文を1つの delta で返す。
+    """
+    key = request_key(req.minutes, req.cause, req.target, req.detail)
+    chunks, leader, source = None, None, "ai"
+    if req.mode == "local":
+        first, source = _local(req)["excuse"], "local"
+    else:
+        # detail が空ならプールから1つの delta で返す（需要もここで数える）
+        first = (pool.take(key) if not key[3] else None) or excuse_cache.get(key) or similar_cache.get(key)
+    if not first:
+        joined = flight.join(key)
+        if joined is None:
+            leader = flight.lead(key)
+            # 応答の送信が始まらないまま切断された場合でも待機者を解放する
+            asyncio.get_running_loop().call_later(
+                STREAM_FLIGHT_TIMEOUT, _settle, leader, None, TransientAIError("ストリームが完了しませんでした"))
+        # 最初の断片までは通常のエラー応答（503/500/429）やローカル生成に切り替えられる
+        try:
+            if joined is None:
+                await rate_limiter.acquire_model()
+                chunks = gemini.astream_excuse(req.minutes, req.cause, req.target, req.detail)
+                waiting = chunks.__anext__()
+            else:
+                waiting = joined
+            if req.mode == "auto":
+                first = await asyncio.wait_for(waiting, AI_DEADLINE)
+            else:
+                first = await waiting
+        except (TransientAIError, asyncio.TimeoutError, QuotaExceeded) as e:
+            _settle(leader, error=e)
+            if req.mode != "auto":
+                if isinstance(e, QuotaExceeded):
+                    raise
+                raise HTTPException(
+                    status_code=503,
+                    detail="AIが混雑しています。しばらくしてからもう一度お試しください。"
+                )
+            chunks, first, source = None, _local(req)["excuse"], "local"
+        except Exception as e:
+            _settle(leader, error=e)
+            raise HTTPException(status_code=500, detail=f"Gemini error: {e}")
+
+    async def events():
+        parts = [first]
+        try:
+            yield _sse("delta", {"delta": first})
+            if chunks is not None:
+                try:
+                    async for text in chunks:
+                        parts.append(text)
+                        yield _sse("delta", {"delta": text})
+                except Exception as e:
+                    _settle(leader, error=TransientAIError(str(e)))
+                    yield _sse("error", {"detail": f"Gemini error: {e}"})
+                    return
+            text = "".join(parts).strip()
+            if chunks is not None:
+                excuse_cache.put(key, text)
+                similar_cache.put(key, text)
+                _settle(leader, text)
+            yield _sse("done", {"excuse": text, "source": source})
+        finally:
+            # 途中で切断されたら、待っているリクエストは一時エラーとして扱わせる
+            _settle(leader, error=TransientAIError("ストリームが中断されました"))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/generate_excuse/stats")
+def generate_excuse_stats():
+    """生成キャッシュ・リクエスト集約の統計"""
+    return {
+        "cache": excuse_cache.stats(),
+        "similar": similar_cache.stats(),
+        "singleflight": flight.stats(),
+        "resilience": gemini.resilience_stats(),
+        "routing": gemini.routing_stats(),
+        "keys": gemini.key_stats(),
+        "usage": gemini.usage_stats(),
+        "pool": pool.stats(),
+        "rate_limit": rate_limiter.stats(),
+    }
+
+
+# モデルを呼ぶルートのレート制限（入口でクライアント別、モデルのクォータ全体は呼び出しの直前）
+rate_limiter = RateLimiter()
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 
+# ルートごとの応答時間（/metrics で公開）
+app.add_middleware(MetricsMiddleware)
 
 # CORS設定
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:8000", "http://127.0.0.1:8000"],
+    allow_origins=["http://localhost:8000", "http://127.0.0.1:8000", "https://*.vercel.app"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -55,9 +306,9 @@ app.add_middleware(
 
 # データモデル
 class ExcuseBase(BaseModel):
-    # title: str
+    title: str = ""
     description: str
-    # category: str
+    category: str = ""
 
 class ExcuseCreate(ExcuseBase):
     pass
@@ -68,68 +319,121 @@ class Excuse(ExcuseBase):
     class Config:
         from_attributes = True
 
-# サンプルデータ
-excuses_db = [
+# サンプルデータ（EXCUSE_STORAGE=memory のときの初期データ）
+SAMPLE_EXCUSES = [
     {
         "id": 1,
-        # "title": "電車が遅延",
+        "title": "電車が遅延",
         "description": "電車が遅延してしまいました",
-        # "category": "交通"
+        "category": "交通"
     },
     {
         "id": 2,
-        # "title": "体調不良",
+        "title": "体調不良",
         "description": "体調が悪くて出社できませんでした",
-        # "category": "健康"
+        "category": "健康"
     },
     {
         "id": 3,
-        # "title": "家族の急用",
+        "title": "家族の急用",
         "description": "家族に急用ができて対応していました",
-        # "category": "家族"
+        "category": "家族"
     }
 ]
 
+# 言い訳テーブル（memory / supabase / sqlite を EXCUSE_STORAGE で切り替え）
+excuses_db = create_repository(SAMPLE_EXCUSES)
+
+async def _db(fn, *args):
+    """ストレージ呼び出し（I/O を伴う実装はスレッドプールでタイムアウト付きで実行）"""
+    if excuses_db.blocking:
+        return await run_query(fn, *args)
+    return fn(*args)
+
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded_handler(request: Request, e: QuotaExceeded):
+    return JSONResponse({"detail": "AIが混雑しています。しばらくしてからもう一度お試しください。"},
+                        status_code=429, headers={"Retry-After": retry_after(e.wait)})
+
+@app.exception_handler(IndexNotReady)
+async def index_not_ready_handler(request: Request, e: IndexNotReady):
+    return JSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": retry_after(INDEX_RETRY_SECONDS)})
+
+@app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request: Request, e: QueryTimeout):
+    return JSONResponse({"detail": str(e)}, status_code=504)
+
 # APIエンドポイント
 @app.get("/")
 async def root():
     return {"message": "Excuse APIへようこそ！"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus のテキスト形式でメトリクスを返す"""
+    return metrics_response()
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "storage": excuses_db.name, "search_ready": excuses_db.index_ready}
 
 @app.get("/api/excuses", response_model=List[Excuse])
-async def get_excuses():
-    """全ての言い訳を取得"""
-    return excuses_db
+async def get_excuses(request: Request, limit: int = Query(PAGE_DEFAULT, ge=1, le=PAGE_MAX),
+                      after: int = Query(0, ge=0), format: Optional[str] = None):
+    """言い訳を id 順に取得（after より後を limit 件。format=ndjson なら残り全件をストリーミング）"""
+    if wants_ndjson(request, format):
+        return ndjson_response(keyset_pages(excuses_db.page, after))
+    rows = await _db(excuses_db.page, after, limit)
+    revision = excuses_db.revision()
+    if revision:
+        version, updated_at = revision
+        response = conditional_json(request, rows, updated_at, etag=f'"v{version}-{after}-{limit}"')
+    else:
+        response = conditional_json(request, rows)
+    response.headers.update(next_page_headers(request, rows, limit))
+    return response
+
+@app.get("/api/excuses/search")
+async def search_excuses(q: str = Query(..., min_length=1, max_length=100),
+                         limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT), offset: int = Query(0, ge=0)):
+    """タイトル・本文の部分一致検索（空白区切りは AND。一致の多い順）"""
+    total, rows = await _db(excuses_db.search, q, limit, offset)
+    return {"query": q, "total": total, "limit": limit, "offset": offset, "results": rows}
+
+@app.post("/api/excuses/bulk")
+async def bulk_create_excuses(request: Request):
+    """NDJSON / CSV の本文から言い訳を一括登録（不正な行はスキップして行番号を返す）"""
+    async def insert_batch(rows: list[dict]) -> int:
+        return len(await _db(excuses_db.create_many, rows))
+    return await bulk_import(iter_records(request), ExcuseCreate, insert_batch)
+
+@app.get("/api/excuses/export")
+async def export_excuses(format: Literal["ndjson", "csv"] = "ndjson"):
+    """全件を id 順に NDJSON / CSV でストリーミング出力"""
+    media_type = "text/csv; charset=utf-8" if format == "csv" else NDJSON
+    return StreamingResponse(export_lines(keyset_pages(excuses_db.page, 0), format), media_type=media_type)
 
 @app.get("/api/excuses/{excuse_id}", response_model=Excuse)
 async def get_excuse(excuse_id: int):
     """指定されたIDの言い訳を取得"""
-    for excuse in excuses_db:
-        if excuse["id"] == excuse_id:
-            return excuse
+    row = await _db(excuses_db.get, excuse_id)
+    if row:
+        return row
     raise HTTPException(status_code=404, detail="言い訳が見つかりません")
 
 @app.post("/api/excuses", response_model=Excuse)
 async def create_excuse(excuse: ExcuseCreate):
     """新しい言い訳を作成"""
-    new_id = max(excuse["id"] for excuse in excuses_db) + 1 if excuses_db else 1
-    new_excuse = {
-        "id": new_id,
-        # "title": excuse.title,
-        "description": excuse.description,
-        # "category": excuse.category
-    }
-    excuses_db.append(new_excuse)
-    return new_excuse
+    return await _db(excuses_db.create, excuse.model_dump())
 
 @app.get("/api/categories")
-async def get_categories():
-    """利用可能なカテゴリを取得"""
-    categories = list(set(excuse["category"] for excuse in excuses_db))
-    return {"categories": categories}
+async def get_categories(request: Request):
+    """利用可能なカテゴリと件数を取得"""
+    counts = await _db(excuses_db.category_counts)
+    revision = excuses_db.revision()
+    return conditional_json(request, {"categories": list(counts), "counts": counts},
+                            revision[1] if revision else None)
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
@@ -0,0 +1,80 @@
+# backend/metrics.py
+import os, time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               REGISTRY, generate_latest)
+from starlette.responses import Response
+
+# 秒単位。ルートは数 ms〜、モデル呼び出しは数百 ms〜数秒に分布する
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+
+HTTP_LATENCY = Histogram(
+    "excuse_http_request_duration_seconds", "ルートごとの応答時間（本文の送信完了まで）",
+    ("method", "route", "status"), buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge("excuse_http_requests_in_flight", "処理中のリクエスト数", multiprocess_mode="livesum")
+
+GEMINI_ATTEMPT_LATENCY = Histogram(
+    "excuse_gemini_attempt_duration_seconds", "Gemini 呼び出し1回（再試行ごと）の所要時間",
+    ("outcome",), buckets=LATENCY_BUCKETS,
+)
+GEMINI_IN_FLIGHT = Gauge("excuse_gemini_calls_in_flight", "再試行を含めて進行中の Gemini 呼び出し数",
+                         multiprocess_mode="livesum")
+GEMINI_RETRIES = Counter("excuse_gemini_retries_total", "Gemini 呼び出しの再試行回数", ("kind",))
+GEMINI_ERRORS = Counter("excuse_gemini_errors_total", "Gemini 呼び出しの失敗（種類別）", ("kind",))
+GEMINI_TRANSIENT = Counter("excuse_gemini_transient_errors_total", "再試行しきれず TransientAIError になった呼び出し")
+GEMINI_EMPTY = Counter("excuse_gemini_empty_responses_total", "空の応答")
+
+DB_LATENCY = Histogram(
+    "excuse_db_query_duration_seconds", "ストレージ呼び出しの所要時間（スレッドプールの待ちを含む）",
+    ("operation",), buckets=LATENCY_BUCKETS,
+)
+DB_TIMEOUTS = Counter("excuse_db_query_timeouts_total", "DB_QUERY_TIMEOUT を超えた呼び出し", ("operation",))
+
+
+class MetricsMiddleware:
+    """ルート単位の応答時間と処理中の数を記録する ASGI ミドルウェア
+
+    ラベルはパスそのものではなくルートのテンプレート（/api/excuses/{excuse_id}）にする。
+    ルートに届く前に応答したミドルウェアは scope["metrics_route"] にラベルを入れておく。
+    ストリーミング応答は本文を送り終えた時点までを計る。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # ルーティング前に返した応答（レート制限の 429 など）は内側のミドルウェアが付けたラベルを使う
+            label = getattr(route, "path", None) or scope.get("metrics_route", "unmatched")
+            HTTP_LATENCY.labels(scope["method"], label, status).observe(time.perf_counter() - start)
+
+
+def _registry():
+    # gunicorn などの複数ワーカーでは PROMETHEUS_MULTIPROC_DIR の値を全ワーカー分まとめる
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,216 @@
+# backend/model_router.py
+import os, time, math, asyncio, threading
+from collections import deque
+
+from prometheus_client import Counter
+
+from resilience import RetryBudget, classify_error
+
+# 優先順のモデル一覧（先頭が通常の呼び出し先、残りは待ちが長いとき・障害時の代替）
+GEMINI_MODELS = [m.strip() for m in os.getenv("GEMINI_MODELS", "gemini-1.5-flash").split(",") if m.strip()]
+
+HEDGE_ENABLED = os.getenv("EXCUSE_HEDGE_ENABLED", "1") == "1"
+# 直近の応答時間のこのパーセンタイルを超えても返ってこなければヘッジを出す
+HEDGE_PERCENTILE = float(os.getenv("EXCUSE_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("EXCUSE_HEDGE_MIN_SAMPLES", "20"))
+# サンプルが足りないうちの待ち時間と、待ち時間の下限・上限（ミリ秒）
+HEDGE_INITIAL_DELAY_MS = float(os.getenv("EXCUSE_HEDGE_INITIAL_DELAY_MS", "1500"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("EXCUSE_HEDGE_MIN_DELAY_MS", "200"))
+HEDGE_MAX_DELAY_MS = float(os.getenv("EXCUSE_HEDGE_MAX_DELAY_MS", "5000"))
+# ヘッジで増える呼び出しを直近の呼び出し数のこの割合までに抑える
+HEDGE_BUDGET_RATIO = float(os.getenv("EXCUSE_HEDGE_BUDGET_RATIO", "0.1"))
+HEDGE_BUDGET_MIN_PER_SEC = float(os.getenv("EXCUSE_HEDGE_BUDGET_MIN_PER_SEC", "0.2"))
+# 一時障害がこの回数続いたモデルは cooldown 秒だけ後回しにする
+MODEL_FAILURES = int(os.getenv("EXCUSE_MODEL_FAILURES", "3"))
+MODEL_COOLDOWN_SECONDS = float(os.getenv("EXCUSE_MODEL_COOLDOWN_SECONDS", "30"))
+
+ROUTED = Counter("excuse_gemini_routed_total", "モデルごとの呼び出し数（role は primary / hedge）", ("model", "role"))
+HEDGES = Counter("excuse_gemini_hedges_total", "ヘッジの結果（fired / won / lost / denied）", ("outcome",))
+
+
+class ModelRoute:
+    """1モデル分の直近の応答時間と連続失敗の状態"""
+
+    def __init__(self, name: str, window: int = 256):
+        self.name = name
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self._failures = 0
+        self._down_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self._down_until
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+    def record_success(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        self._failures = 0
+
+    def record_censored(self, seconds: float) -> None:
+        """ヘッジに負けて打ち切った呼び出し（実際の応答時間は seconds 以上）"""
+        self.latencies.append(seconds)
+
+    def record_failure(self) -> None:
+        self.errors += 1
+        self._failures += 1
+        if self._failures >= MODEL_FAILURES:
+            self._down_until = time.monotonic() + MODEL_COOLDOWN_SECONDS
+            self._failures = 0
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "hedge_wins": self.wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "cooldown": round(max(0.0, self._down_until - time.monotonic()), 3),
+        }
+
+
+class ModelRouter:
+    """優先順のモデル一覧から呼び出し先を選び、遅いときはヘッジ（2本目の呼び出し）を出す
+
+    再試行では attempt ごとに次のモデルへ回す。ヘッジ先は次の利用可能なモデル
+    （1つしかなければ同じモデル）で、先に返った有効な応答を使い、残りはキャンセルする。
+    """
+
+    def __init__(self, models: list[str] | None = None, hedge: bool = HEDGE_ENABLED):
+        self.routes = [ModelRoute(m) for m in (models or GEMINI_MODELS)]
+        self.hedge = hedge
+        self.budget = RetryBudget(ratio=HEDGE_BUDGET_RATIO, min_per_sec=HEDGE_BUDGET_MIN_PER_SEC)
+        self._lock = threading.Lock()
+        self.hedges = {"fired": 0, "won": 0, "lost": 0, "denied": 0}
+
+    def pick(self, attempt: int = 0) -> tuple[ModelRoute, ModelRoute]:
+        """(呼び出し先, ヘッジ先)"""
+        now = time.monotonic()
+        routes = [r for r in self.routes if r.available(now)] or self.routes
+        i = attempt % len(routes)
+        return routes[i], routes[(i + 1) % len(routes)]
+
+    def hedge_delay(self, route: ModelRoute) -> float:
+        delay = HEDGE_INITIAL_DELAY_MS / 1000
+        if len(route.latencies) >= HEDGE_MIN_SAMPLES:
+            delay = route.percentile(HEDGE_PERCENTILE)
+        return min(HEDGE_MAX_DELAY_MS / 1000, max(HEDGE_MIN_DELAY_MS / 1000, delay))
+
+    def _start(self, route: ModelRoute, role: str) -> None:
+        with self._lock:
+            route.calls += 1
+        ROUTED.labels(route.name, role).inc()
+
+    def _finish(self, route: ModelRoute, started: float, e: Exception | None) -> None:
+        with self._lock:
+            if e is None:
+                route.record_success(time.perf_counter() - started)
+            elif classify_error(e) != "permanent":
+                route.record_failure()
+
+    def _hedge_result(self, outcome: str) -> None:
+        with self._lock:
+            self.hedges[outcome] += 1
+        HEDGES.labels(outcome).inc()
+
+    def call(self, call, attempt: int = 0):
+        """同期版（ヘッジなし）。call(model) を呼ぶ"""
+        route, _ = self.pick(attempt)
+        self._start(route, "primary")
+        started = time.perf_counter()
+        try:
+            result = call(route.name)
+        except Exception as e:
+            self._finish(route, started, e)
+            raise
+        self._finish(route, started, None)
+        return result
+
+    async def _timed(self, route: ModelRoute, role: str, call):
+        self._start(route, role)
+        started = time.perf_counter()
+        try:
+            result = await call(route.name)
+        except Exception as e:
+            self._finish(route, started, e)
+            raise
+        self._finish(route, started, None)
+        return result
+
+    async def acall(self, call, attempt: int = 0, discard=None):
+        """await call(model) を呼ぶ。hedge_delay を過ぎたら2本目を出し、先に返った有効な応答を使う
+
+        空の応答は失敗と同じく相手を待ち、どちらもだめなら先に出した方の結果（例外）を返す。
+        同じ回に両方返ったときなど、使わなかった応答は await discard(result) で後始末する。
+        """
+        route, backup = self.pick(attempt)
+        self.budget.record_call()
+        started = time.perf_counter()
+        delay = self.hedge_delay(route)
+        first = asyncio.ensure_future(self._timed(route, "primary", call))
+        tasks = [first]
+        result = None
+        try:
+            if not self.hedge:
+                result = await first
+                return result
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                result = first.result()
+                return result
+            if not self.budget.try_retry():
+                self._hedge_result("denied")
+                result = await first
+                return result
+            self._hedge_result("fired")
+            tasks.append(asyncio.ensure_future(self._timed(backup, "hedge", call)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result():
+                        hedged = task is not first
+                        self._hedge_result("won" if hedged else "lost")
+                        if hedged:
+                            with self._lock:
+                                backup.wins += 1
+                        result = task.result()
+                        return result
+            self._hedge_result("lost")
+            result = first.result()
+            return result
+        finally:
+            if len(tasks) > 1 and not first.done():
+                # 打ち切った1本目の応答時間は分からないが、少なくとも今までの経過時間（delay 以上）はかかっている。
+                # 記録しないと遅い応答ほど統計から抜けて、p95（ヘッジの待ち時間）が低く見積もられる
+                with self._lock:
+                    route.record_censored(max(time.perf_counter() - started, delay))
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif discard is not None and not task.cancelled() and task.exception() is None:
+                    other = task.result()
+                    if other and other is not result:
+                        await discard(other)
+
+    def stats(self) -> dict:
+        with self._lock:
+            fired = self.hedges["fired"]
+            return {
+                "models": {r.name: r.stats() for r in self.routes},
+                "hedge": {
+                    "enabled": self.hedge,
+                    "percentile": HEDGE_PERCENTILE,
+                    "delay_ms": round(self.hedge_delay(self.routes[0]) * 1000, 1),
+                    **self.hedges,
+                    "win_rate": round(self.hedges["won"] / fired, 3) if fired else 0.0,
+                    "budget": self.budget.stats(),
+                },
+            }
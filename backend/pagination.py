@@ -0,0 +1,56 @@
+# backend/pagination.py
+import json
+from urllib.parse import urlencode
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+PAGE_DEFAULT = 100
+PAGE_MAX = 1000
+# NDJSON ストリーミング時に1回で読み込む件数
+STREAM_PAGE = 500
+
+NDJSON = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request, format: str | None) -> bool:
+    if format:
+        return format == "ndjson"
+    return NDJSON in request.headers.get("accept", "")
+
+
+def next_page_headers(request: Request, rows: list[dict], limit: int) -> dict:
+    """ページが埋まっていれば次ページの位置を Link / X-Next-After で知らせる"""
+    if len(rows) < limit:
+        return {}
+    after = rows[-1]["id"]
+    query = urlencode({"limit": limit, "after": after})
+    return {
+        "Link": f'<{request.url.path}?{query}>; rel="next"',
+        "X-Next-After": str(after),
+    }
+
+
+def _ndjson_lines(pages):
+    for rows in pages:
+        if rows:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def ndjson_response(pages) -> StreamingResponse:
+    """ページ単位のイテレータを NDJSON で逐次返す（全件をメモリに載せない）
+
+    同期イテレータは Starlette がスレッドプールで回すので、
+    ページ取得がブロッキング I/O でもイベントループは止まらない。
+    """
+    return StreamingResponse(_ndjson_lines(pages), media_type=NDJSON)
+
+
+def keyset_pages(fetch_page, after: int, page_size: int = STREAM_PAGE):
+    """fetch_page(after, limit) を id の keyset で最後まで呼び続ける"""
+    while True:
+        rows = fetch_page(after, page_size)
+        yield rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1]["id"]
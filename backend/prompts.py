@@ -0,0 +1,127 @@
+# backend/prompts.py
+import os, re, threading
+from typing import NamedTuple
+
+from prometheus_client import Counter
+
+from excuse_rules import minutes_label, tone_for
+
+PROMPT_VERSION = os.getenv("EXCUSE_PROMPT_VERSION", "v1")
+
+# 出力上限（トークン）。丁寧な文体ほど長くなる
+OUTPUT_TOKENS_BY_TONE = {"丁寧": 90, "ニュートラル": 72, "カジュアル": 56}
+# 追加説明が長い・長さの指定がある（最大5文）ときの上乗せ分
+LONG_DETAIL_CHARS = 40
+LONG_DETAIL_EXTRA_TOKENS = 64
+LENGTH_HINT = re.compile(r"長め|長く|詳しく|詳細|丁寧に|\d+\s*文")
+
+GEMINI_TOKENS = Counter("excuse_gemini_tokens_total", "Gemini の使用トークン数", ("kind", "version"))
+
+
+class Prompt(NamedTuple):
+    version: str
+    system: str
+    user: str
+    max_output_tokens: int
+
+    def batch(self, n: int, suffix: str) -> "Prompt":
+        """n 件をまとめて出させるときのプロンプト（出力上限も n 件分にする）"""
+        return self._replace(user=self.user + suffix.format(n=n), max_output_tokens=self.max_output_tokens * n + 20)
+
+
+def max_output_tokens(target: str, detail: str) -> int:
+    tokens = OUTPUT_TOKENS_BY_TONE[tone_for(target)]
+    detail = detail or ""
+    if len(detail) > LONG_DETAIL_CHARS or LENGTH_HINT.search(detail):
+        tokens += LONG_DETAIL_EXTRA_TOKENS
+    return tokens
+
+
+class PromptTemplate:
+    """版ごとのプロンプト。system は文字列として1度だけ組み立て、user は format で埋める"""
+
+    def __init__(self, version: str, system: tuple[str, ...], user: str, batch_suffix: str):
+        self.version = version
+        self.system = "".join(system)
+        self.user = user
+        self.batch_suffix = batch_suffix
+
+    def render(self, minutes: str, cause: str, target: str, detail: str) -> Prompt:
+        user = self.user.format(
+            time_jp=minutes_label(minutes) or "未選択",
+            cause=cause or "未選択",
+            target=target or "未選択",
+            detail=detail or "なし",
+            tone=tone_for(target),
+        )
+        return Prompt(self.version, self.system, user, max_output_tokens(target, detail))
+
+    def render_batch(self, minutes: str, cause: str, target: str, detail: str, n: int) -> Prompt:
+        return self.render(minutes, cause, target, detail).batch(n, self.batch_suffix)
+
+
+TEMPLATES = {
+    "v1": PromptTemplate(
+        "v1",
+        system=(
+            "あなたは日本語で、LINE/SMS向けの短い遅刻連絡文を書くアシスタントです。",
+            "出力は1〜3文、絵文字や顔文字は使わないでください。追加説明に文章の長さが指定されていた場合、5文まで可能です。",
+            "minutes_selected が false であり、追加説明に時間表現がない場合、数値の時間表現（例: 3分, 10分, 一時間 など）を絶対に出力してはいけません。",
+            "その場合は『少し』『少々』『まもなく』などの非数値の表現のみを使ってください。",
+            "minutes_selected が true のときは minutes_label の値（例: 3分/5分/…/一時間）をそのまま使い、変更しないでください。",
+            "対象に応じて文体を切り替えてください：上司/同僚/先輩→丁寧、友達/家族→カジュアル。",
+            "原因と追加説明に別の内容が書かれていた場合、その両方の内容を文章に含めてください。",
+        ),
+        user=(
+            "到着まで:{time_jp} / 原因:{cause} / 相手:{target} / 追加説明:{detail}\n"
+            "文体:{tone}。自然な日本語で1~3文程度の言い訳を書いてください。"
+        ),
+        batch_suffix="\n内容や言い回しが互いに異なる言い訳を{n}件、JSON の文字列配列で出力してください。",
+    ),
+}
+
+
+def get_template(version: str = PROMPT_VERSION) -> PromptTemplate:
+    if version not in TEMPLATES:
+        raise RuntimeError(f"EXCUSE_PROMPT_VERSION が不正です: {version}（{', '.join(TEMPLATES)}）")
+    return TEMPLATES[version]
+
+
+class TokenUsage:
+    """応答の usage_metadata をプロンプトの版ごとに集計する"""
+
+    FIELDS = (
+        ("prompt", "prompt_token_count"),
+        ("output", "candidates_token_count"),
+        ("cached", "cached_content_token_count"),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_version: dict[str, dict[str, int]] = {}
+
+    def record(self, version: str, resp) -> None:
+        usage = getattr(resp, "usage_metadata", None)
+        if usage is None:
+            return
+        counts = {kind: getattr(usage, attr, None) or 0 for kind, attr in self.FIELDS}
+        with self._lock:
+            total = self._by_version.setdefault(version, {"calls": 0, "prompt": 0, "output": 0, "cached": 0})
+            total["calls"] += 1
+            for kind, n in counts.items():
+                total[kind] += n
+        for kind, n in counts.items():
+            if n:
+                GEMINI_TOKENS.labels(kind, version).inc(n)
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for version, total in self._by_version.items():
+                calls = total["calls"] or 1
+                result[version] = {
+                    **total,
+                    "avg_prompt": round(total["prompt"] / calls, 1),
+                    "avg_output": round(total["output"] / calls, 1),
+                }
+            return result
@@ -0,0 +1,220 @@
+# backend/rate_limit.py
+import os, time, math, json, inspect, hashlib, threading, logging
+from collections import OrderedDict
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# クライアント（API キー、なければ IP）ごとの上限
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "5"))
+# モデルのクォータ全体（GOOGLE_API_KEYS が複数なら全キーの合計から、プールの補充分 EXCUSE_POOL_RPM を差し引いた値にしておく）。0 で無効
+GEMINI_QUOTA_RPM = float(os.getenv("GEMINI_QUOTA_RPM", "60"))
+GEMINI_QUOTA_TPM = float(os.getenv("GEMINI_QUOTA_TPM", "250000"))
+# 1リクエストあたりの見込みトークン数（プロンプト + 出力）
+EST_TOKENS_PER_REQUEST = float(os.getenv("EXCUSE_EST_TOKENS_PER_REQUEST", "400"))
+# 前段のプロキシが付ける X-Forwarded-For を信頼するか
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# X-API-Key で枠を分けてよいキー（カンマ区切り）。一覧にないキーは無視して IP で数える
+RATE_LIMIT_API_KEYS = frozenset(k.strip() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip())
+
+# モデルを呼びうるルート
+LIMITED_PATHS = ("/generate_excuse", "/generate_excuses", "/generate_excuse/stream")
+
+RATE_LIMITED = Counter("excuse_rate_limited_total", "レート制限で 429 を返した数", ("scope",))
+
+
+class MemoryBucketStore:
+    """プロセス内のトークンバケット（キー数は LRU で抑える）
+
+    満タンまで回復したバケットは消えていても同じなので、古いキーから捨ててよい。
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """cost 分を取り出せれば 0、足りなければ取り出せるまでの秒数を返す"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+# 時刻は Redis 側（TIME）を使い、ワーカー間の時計のずれの影響を受けないようにする
+_REDIS_TAKE = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(b[1]) or burst
+local updated = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """複数ワーカー・複数台で共有するトークンバケット（redis パッケージが必要）"""
+
+    def __init__(self, url: str, prefix: str = "excuse:ratelimit:"):
+        import redis.asyncio
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_REDIS_TAKE)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        return float(await self._take(keys=[self.prefix + key], args=[rate, burst, cost]))
+
+
+def create_store():
+    if RATE_LIMIT_REDIS_URL:
+        logger.info("レート制限: Redis を使用します")
+        return RedisBucketStore(RATE_LIMIT_REDIS_URL)
+    return MemoryBucketStore()
+
+
+def client_id(scope, api_keys: frozenset[str] = RATE_LIMIT_API_KEYS) -> str:
+    """登録済みの API キー（X-API-Key）ならそのハッシュ、なければ接続元 IP
+
+    ヘッダはクライアントが自由に付けられるので、一覧にないキーで枠を分けると
+    リクエストごとに値を変えるだけで制限をすり抜けられてしまう。
+    """
+    headers = dict(scope.get("headers") or ())
+    api_key = headers.get(b"x-api-key", b"").decode("latin-1")
+    if api_key and api_key in api_keys:
+        return "key:" + hashlib.blake2b(api_key.encode("latin-1"), digest_size=12).hexdigest()
+    forwarded = headers.get(b"x-forwarded-for")
+    if RATE_LIMIT_TRUST_FORWARDED and forwarded:
+        return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class QuotaExceeded(Exception):
+    """モデルのクォータ全体（RPM/TPM）の枠が足りないことを表す例外"""
+
+    def __init__(self, kind: str, wait: float):
+        super().__init__(f"モデルのクォータ（{kind}）を超えています")
+        self.kind = kind
+        self.wait = wait
+
+
+class RateLimiter:
+    """クライアント別と全体（モデルの RPM/TPM）のトークンバケット
+
+    クライアント別はミドルウェアで入口に掛け、全体の枠はモデルを実際に呼ぶ直前に取る
+    （キャッシュ・プール・ローカル生成で返すリクエストはモデルのクォータを使わない）。
+    """
+
+    def __init__(self, store=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.store = store or create_store()
+        self.enabled = enabled
+        self.allowed = 0
+        self.model_calls = 0
+        self.limited = {"client": 0, "rpm": 0, "tpm": 0}
+
+    async def _take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        wait = self.store.take(key, rate, burst, cost)
+        return await wait if inspect.isawaitable(wait) else wait
+
+    @staticmethod
+    def _model_buckets():
+        # (枠の名前, キー, 1秒あたりの回復量, 上限, 1回の消費量)
+        if GEMINI_QUOTA_RPM > 0:
+            yield "rpm", "global:rpm", GEMINI_QUOTA_RPM / 60, GEMINI_QUOTA_RPM, 1.0
+        if GEMINI_QUOTA_TPM > 0:
+            yield "tpm", "global:tpm", GEMINI_QUOTA_TPM / 60, GEMINI_QUOTA_TPM, EST_TOKENS_PER_REQUEST
+
+    def _limited(self, name: str) -> None:
+        self.limited[name] += 1
+        RATE_LIMITED.labels(name).inc()
+
+    async def check(self, client: str) -> tuple[str, float] | None:
+        """クライアント別の枠。通してよければ None、だめなら ("client", 待ち秒数)"""
+        wait = await self._take(client, RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BURST)
+        if wait:
+            self._limited("client")
+            return "client", wait
+        self.allowed += 1
+        return None
+
+    async def acquire_model(self) -> None:
+        """モデルを1回呼ぶ分の全体の枠を取る。足りなければ QuotaExceeded"""
+        if not self.enabled:
+            return
+        for name, key, rate, burst, cost in self._model_buckets():
+            wait = await self._take(key, rate, burst, cost)
+            if wait:
+                self._limited(name)
+                raise QuotaExceeded(name, wait)
+        self.model_calls += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "store": type(self.store).__name__,
+            "per_minute": RATE_LIMIT_PER_MINUTE,
+            "burst": RATE_LIMIT_BURST,
+            "quota_rpm": GEMINI_QUOTA_RPM,
+            "quota_tpm": GEMINI_QUOTA_TPM,
+            "allowed": self.allowed,
+            "model_calls": self.model_calls,
+            "limited": dict(self.limited),
+        }
+
+
+class RateLimitMiddleware:
+    """モデルを呼びうるルートの POST にクライアント別の枠を掛け、超えたら 429 と Retry-After を返す"""
+
+    def __init__(self, app, limiter: RateLimiter, paths=LIMITED_PATHS):
+        self.app = app
+        self.limiter = limiter
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if not (scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths):
+            return await self.app(scope, receive, send)
+        denied = await self.limiter.check(client_id(scope))
+        if denied is None:
+            return await self.app(scope, receive, send)
+
+        _, wait = denied
+        # ルーティングされないまま返すので、外側の MetricsMiddleware 用にラベルを付けておく（対象のパスは固定の数件）
+        scope["metrics_route"] = scope["path"]
+        body = json.dumps({"detail": "リクエストが多すぎます。しばらくしてからもう一度お試しください。"},
+                          ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after(wait).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def retry_after(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
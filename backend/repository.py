@@ -0,0 +1,236 @@
+# backend/repository.py
+import os, abc, time, logging, threading
+
+from excuse_store import ExcuseStore
+from category_stats import CategoryCounts, fetch_category_counts
+from search_index import NgramIndex, split_terms
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("id", "title", "description", "category")
+
+# 他のワーカーで追加された行を検索索引に取り込む間隔（秒）
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "60"))
+# 検索索引を読み込むときの1クエリあたりの件数（1ページずつ DB_QUERY_TIMEOUT 内に収める）
+SEARCH_INDEX_PAGE = int(os.getenv("SEARCH_INDEX_PAGE", "1000"))
+
+
+class IndexNotReady(Exception):
+    """検索索引の初回読み込みがまだ終わっていないことを表す例外"""
+
+
+def _row(item: dict) -> dict:
+    """ストレージの行を API の形（4列）にそろえる"""
+    return {
+        "id": item["id"],
+        "title": item.get("title") or "",
+        "description": item["description"],
+        "category": item.get("category") or "",
+    }
+
+
+class ExcuseRepository(abc.ABC):
+    """言い訳テーブルへのアクセスをまとめたインタフェース
+
+    メソッドはすべて同期。blocking が True の実装は I/O を伴うので、
+    アプリ側では run_query を通してスレッドプールで呼ぶ。
+    実装は abstractmethod をすべて定義する（足りなければ生成時に TypeError になる）。
+    """
+
+    name = ""
+    blocking = True
+    # False の実装は、アプリ側で sync_index_page を True が返るまで呼んで検索索引を作る
+    index_ready = True
+
+    def __init__(self):
+        # カテゴリ件数はプロセス内で増分更新し、一定間隔で集計し直す
+        self.counts = CategoryCounts()
+
+    def load(self) -> None:
+        """起動時の準備（カテゴリ件数の読み込み）"""
+        self.counts.load(self._count_categories())
+
+    @abc.abstractmethod
+    def page(self, after: int, limit: int) -> list[dict]:
+        """id > after を id 昇順に最大 limit 件（keyset ページング）"""
+
+    @abc.abstractmethod
+    def get(self, excuse_id: int) -> dict | None:
+        """id の行。なければ None"""
+
+    def create(self, row: dict) -> dict:
+        return self.create_many([row])[0]
+
+    @abc.abstractmethod
+    def create_many(self, rows: list[dict]) -> list[dict]:
+        """複数件をまとめて追加し、採番後の行を返す"""
+
+    def category_counts(self) -> dict:
+        """カテゴリ名順の {カテゴリ: 件数}"""
+        if self.counts.stale():
+            self.counts.load(self._count_categories())
+        return self.counts.snapshot()["counts"]
+
+    @abc.abstractmethod
+    def _count_categories(self) -> dict:
+        """ストレージから集計した {カテゴリ: 件数}"""
+
+    def search(self, query: str, limit: int, offset: int = 0) -> tuple[int, list[dict]]:
+        """(一致件数, 順位順の行) を返す（空白区切りの語をすべて含む行）"""
+        total, ids = self.index.search(split_terms(query), limit, offset)
+        return total, self._rows(ids)
+
+    @abc.abstractmethod
+    def _rows(self, ids: list[int]) -> list[dict]:
+        """ids の行を ids の順に（見つからない id は飛ばす）"""
+
+    def _added(self, rows: list[dict]) -> list[dict]:
+        for row in rows:
+            self.counts.add(row["category"])
+        return rows
+
+    def revision(self) -> tuple[int, float] | None:
+        """(変更世代, 最終更新時刻)。プロセス内で把握できる実装のみ返す"""
+        return None
+
+
+class MemoryRepository(ExcuseRepository):
+    """プロセス内の ExcuseStore を使う実装（再起動で消える）"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, rows=()):
+        self.store = ExcuseStore(rows)
+        self.index = NgramIndex()
+        self.index.add_many(self.store.all())
+
+    def load(self) -> None:
+        pass
+
+    def page(self, after: int, limit: int) -> list[dict]:
+        return self.store.page(after, limit)
+
+    def get(self, excuse_id: int) -> dict | None:
+        record = self.store.get(excuse_id)
+        return record.to_dict() if record else None
+
+    def create_many(self, rows: list[dict]) -> list[dict]:
+        created = [record.to_dict() for record in self.store.create_many(rows)]
+        self.index.add_many(created)
+        return created
+
+    def _rows(self, ids: list[int]) -> list[dict]:
+        return [self.store.get(excuse_id).to_dict() for excuse_id in ids]
+
+    def _count_categories(self) -> dict:
+        return self.store.category_counts()
+
+    def category_counts(self) -> dict:
+        return self.store.category_counts()
+
+    def revision(self) -> tuple[int, float] | None:
+        return self.store.version, self.store.updated_at
+
+
+class SupabaseRepository(ExcuseRepository):
+    """Supabase の excuses テーブルを使う実装"""
+
+    name = "supabase"
+
+    def __init__(self, url: str, key: str):
+        super().__init__()
+        self._url, self._key = url, key
+        self._client = None
+        # 検索索引は起動時に全件から作り、以後は synced_id より後を定期的に取り込む
+        self.index = NgramIndex()
+        self.index_ready = False
+        self.synced_id = 0
+        self.synced_at = 0.0
+        self._sync_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # supabase の読み込みと接続の生成は最初のクエリ（通常は lifespan の load）まで遅らせる
+        if self._client is None:
+            from supabase import create_client
+            from db import client_options
+            self._client = create_client(self._url, self._key, options=client_options())
+        return self._client
+
+    def sync_index_page(self) -> bool:
+        """synced_id より後を1ページ分だけ検索索引に取り込み、最後まで追いついたら True
+
+        全件を1回の呼び出しで読むと件数に比例して DB_QUERY_TIMEOUT を超えるので、
+        初回の読み込みはアプリ側のバックグラウンドタスクから1ページずつ呼ぶ。
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            # 他のスレッドが取り込み中（同じページを二重に読まない）
+            return False
+        try:
+            rows = self.page(self.synced_id, SEARCH_INDEX_PAGE)
+            self.index.add_many(rows)
+            if rows:
+                self.synced_id = rows[-1]["id"]
+            if len(rows) < SEARCH_INDEX_PAGE:
+                self.synced_at = time.monotonic()
+                if not self.index_ready:
+                    self.index_ready = True
+                    logger.info(f"検索索引: {len(self.index)}件")
+                return True
+            return False
+        finally:
+            self._sync_lock.release()
+
+    def search(self, query: str, limit: int, offset: int = 0) -> tuple[int, list[dict]]:
+        if not self.index_ready:
+            raise IndexNotReady("検索索引を準備中です。しばらくしてからもう一度お試しください。")
+        # 他ワーカーの追加分は1回の検索で1ページまで取り込む（残りは次の検索で続きから）
+        if time.monotonic() - self.synced_at >= SEARCH_REFRESH_SECONDS:
+            self.sync_index_page()
+        return super().search(query, limit, offset)
+
+    def _rows(self, ids: list[int]) -> list[dict]:
+        if not ids:
+            return []
+        response = self.client.table('excuses').select('*').in_('id', ids).execute()
+        by_id = {item["id"]: _row(item) for item in response.data}
+        return [by_id[excuse_id] for excuse_id in ids if excuse_id in by_id]
+
+    def page(self, after: int, limit: int) -> list[dict]:
+        response = self.client.table('excuses').select('*').gt('id', after).order('id').range(0, limit - 1).execute()
+        return [_row(item) for item in response.data]
+
+    def get(self, excuse_id: int) -> dict | None:
+        response = self.client.table('excuses').select('*').eq('id', excuse_id).execute()
+        return _row(response.data[0]) if response.data else None
+
+    def create_many(self, rows: list[dict]) -> list[dict]:
+        data = [{k: row.get(k, "") for k in ("title", "description", "category")} for row in rows]
+        response = self.client.table('excuses').insert(data).execute()
+        created = [_row(item) for item in response.data]
+        # 自分の追加はすぐ検索できるようにする（synced_id は進めないので他ワーカー分も後で取り込める）
+        self.index.add_many(created)
+        return self._added(created)
+
+    def _count_categories(self) -> dict:
+        return fetch_category_counts(self.client)
+
+
+def create_repository(seed=()) -> ExcuseRepository:
+    """EXCUSE_STORAGE（memory | supabase | sqlite）に応じた実装を返す
+
+    memory のときだけ seed の行を初期データとして入れる。
+    """
+    storage = os.getenv("EXCUSE_STORAGE", "memory")
+    if storage == "supabase":
+        repo = SupabaseRepository(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    elif storage == "sqlite":
+        from sqlite_repository import SqliteRepository
+        repo = SqliteRepository(os.getenv("EXCUSE_SQLITE_PATH", "excuses.db"))
+    elif storage == "memory":
+        repo = MemoryRepository(seed)
+    else:
+        raise RuntimeError(f"EXCUSE_STORAGE が不正です: {storage}（memory | supabase | sqlite）")
+    logger.info(f"ストレージ: {repo.name}")
+    return repo
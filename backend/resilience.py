@@ -0,0 +1,158 @@
+# backend/resilience.py
+import os, sys, time, asyncio, threading
+from collections import deque
+
+RETRY_BUDGET_RATIO = float(os.getenv("GEMINI_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SEC = float(os.getenv("GEMINI_RETRY_BUDGET_MIN_PER_SEC", "0.5"))
+BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+# ハーフオープンの試行がこの秒数を超えても終わらなければ失敗とみなしてオープンに戻す
+BREAKER_PROBE_TIMEOUT = float(os.getenv("GEMINI_BREAKER_PROBE_TIMEOUT", "30"))
+
+# 再試行してよいHTTPステータス（タイムアウト・レート制限・サーバ側の一時障害）
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def classify_error(e: Exception) -> str:
+    """SDK の例外を "rate_limited" / "unavailable" / "timeout" / "permanent" に分類する"""
+    # SDK と httpx は起動を軽くするため遅れて読み込まれる。まだ読み込まれていなければその例外も起きない
+    genai_errors = sys.modules.get("google.genai.errors")
+    httpx = sys.modules.get("httpx")
+    if genai_errors is not None and isinstance(e, genai_errors.APIError):
+        if e.code == 429:
+            return "rate_limited"
+        if e.code == 408 or e.code == 504:
+            return "timeout"
+        if e.code in TRANSIENT_STATUS:
+            return "unavailable"
+        return "permanent"
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError)) or (httpx is not None and isinstance(e, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(e, ConnectionError) or (httpx is not None and isinstance(e, httpx.NetworkError)):
+        return "unavailable"
+    return "permanent"
+
+
+class RetryBudget:
+    """直近 window 秒の呼び出し数に対して再試行の割合を ratio までに抑える"""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_per_sec: float = RETRY_BUDGET_MIN_PER_SEC,
+                 window: float = 10.0):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.window = window
+        self._calls: deque[float] = deque()
+        self._retries: deque[float] = deque()
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def _trim(self, now: float) -> None:
+        edge = now - self.window
+        for q in (self._calls, self._retries):
+            while q and q[0] < edge:
+                q.popleft()
+
+    def record_call(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_retry(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = self.min_per_sec * self.window + self.ratio * len(self._calls)
+            if len(self._retries) >= allowed:
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {
+                "ratio": self.ratio,
+                "window": self.window,
+                "calls_in_window": len(self._calls),
+                "retries_in_window": len(self._retries),
+                "denied": self.denied,
+            }
+
+
+class CircuitBreaker:
+    """連続した一時障害で開き、reset_timeout 後に1件だけ試すハーフオープンに移る"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET_SECONDS,
+                 probe_timeout: float = BREAKER_PROBE_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN and self._probing and now - self._probe_started >= self.probe_timeout:
+                # 試行が返ってこないままならオープンに戻す
+                self.state = self.OPEN
+                self._opened_at = now
+                self._probing = False
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def release_probe(self) -> None:
+        """成功・失敗を記録せずに終わった（キャンセルされた）試行の枠を返す"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "retry_in": round(retry_in, 3),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,73 @@
+# backend/search_index.py
+import heapq, threading, unicodedata
+from array import array
+
+SEARCH_MAX_LIMIT = 100
+
+
+def normalize_text(text: str) -> str:
+    """全角/半角・大文字/小文字の違いを吸収する（索引と検索語の両方に使う）"""
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def split_terms(query: str) -> list[str]:
+    """空白区切りの検索語（すべてを含む行だけを返す AND 検索）"""
+    return [term for term in normalize_text(query).split() if term]
+
+
+def _grams(text: str) -> set[str]:
+    # 分かち書きしない日本語向けに1文字と2文字の n-gram を索引する
+    return {text[i:i + 2] for i in range(len(text) - 1)} | set(text)
+
+
+class NgramIndex:
+    """文字 n-gram の転置索引（プロセス内）
+
+    ポスティングは id を追加順に並べた array で持ち、メモリを抑える。
+    検索では各検索語で最も件数の少ない n-gram から候補を取り、
+    本文に実際に含まれるかを確かめてから出現回数で順位付けする。
+    """
+
+    def __init__(self):
+        self._postings: dict[str, array] = {}
+        self._texts: dict[int, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add_many(self, rows) -> None:
+        with self._lock:
+            for row in rows:
+                excuse_id = row["id"]
+                if excuse_id in self._texts:
+                    continue
+                title, description = normalize_text(row["title"]), normalize_text(row["description"])
+                self._texts[excuse_id] = (title, description)
+                for gram in _grams(title) | _grams(description):
+                    if not gram.isspace():
+                        self._postings.setdefault(gram, array("q")).append(excuse_id)
+
+    def _candidates(self, term: str) -> array:
+        grams = [gram for gram in _grams(term) if not gram.isspace()] or [term]
+        return min((self._postings.get(gram, array("q")) for gram in grams), key=len)
+
+    def search(self, terms: list[str], limit: int, offset: int = 0) -> tuple[int, list[int]]:
+        """(一致件数, 順位順の id) を返す（タイトルでの一致を本文の2倍に数える）"""
+        if not terms:
+            return 0, []
+        with self._lock:
+            candidates = min((self._candidates(term) for term in terms), key=len)
+            scored = []
+            for excuse_id in candidates:
+                title, description = self._texts[excuse_id]
+                score = 0
+                for term in terms:
+                    hits = 2 * title.count(term) + description.count(term)
+                    if not hits:
+                        break
+                    score += hits
+                else:
+                    scored.append((-score, -excuse_id))
+        top = heapq.nsmallest(offset + limit, scored)
+        return len(scored), [-excuse_id for _, excuse_id in top[offset:]]
@@ -0,0 +1,7 @@
+# backend/settings.py
+# backend/.env の読み込みはここで1回だけ行う。os.getenv を使うモジュールより先に import する
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
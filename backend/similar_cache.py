@@ -0,0 +1,148 @@
+# backend/similar_cache.py
+import os, time, random, threading, zlib
+from collections import OrderedDict
+
+from excuse_rules import time_expression
+
+SIMILAR_MAX_ENTRIES = int(os.getenv("EXCUSE_SIMILAR_MAX_ENTRIES", "4096"))  # 0 で無効
+SIMILAR_THRESHOLD = float(os.getenv("EXCUSE_SIMILAR_THRESHOLD", "0.6"))     # 再利用する Jaccard 係数の下限
+SIMILAR_TTL = float(os.getenv("EXCUSE_SIMILAR_TTL", os.getenv("EXCUSE_CACHE_TTL", "3600")))
+SIMILAR_PERMUTATIONS = int(os.getenv("EXCUSE_SIMILAR_PERMUTATIONS", "64"))
+SIMILAR_BANDS = int(os.getenv("EXCUSE_SIMILAR_BANDS", "16"))
+SIMILAR_VARIANTS = 3
+
+_PRIME = (1 << 61) - 1
+
+
+def shingles(detail: str) -> frozenset[str]:
+    """文字2-gram の集合（空白は無視する）"""
+    text = "".join(detail.split())
+    if len(text) < 2:
+        return frozenset()
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
+
+class MinHasher:
+    """(a*x + b) mod p の擬似置換で MinHash 署名を作る（seed 固定でプロセス間でも同じ署名）"""
+
+    def __init__(self, permutations: int = SIMILAR_PERMUTATIONS, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(permutations)]
+
+    def signature(self, grams: frozenset[str]) -> tuple[int, ...]:
+        hashes = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+        return tuple(min((a * x + b) % _PRIME for x in hashes) for a, b in self.params)
+
+
+class _Entry:
+    __slots__ = ("scope", "grams", "bands", "when", "excuses")
+
+    def __init__(self, scope: tuple, grams: frozenset[str], bands: list[tuple], when: str):
+        self.scope = scope
+        self.grams = grams
+        self.bands = bands
+        self.when = when
+        self.excuses: list[tuple[float, str]] = []
+
+
+class SimilarExcuseCache:
+    """detail がほぼ同じ過去のリクエストの言い訳を再利用する近似キャッシュ
+
+    minutes / cause / target が同じものだけを対象に、detail の文字2-gram の
+    MinHash 署名を LSH（バンド分割）で引いて候補を絞り、実際の Jaccard 係数が
+    threshold 以上で最も近いものを返す。件数は max_entries の LRU で抑える。
+    detail に含まれる時間表現（「20分」など）が違うものは再利用しない。
+    """
+
+    def __init__(self, max_entries: int = SIMILAR_MAX_ENTRIES, threshold: float = SIMILAR_THRESHOLD,
+                 ttl: float = SIMILAR_TTL, permutations: int = SIMILAR_PERMUTATIONS, bands: int = SIMILAR_BANDS):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.rows = max(1, permutations // bands)
+        self.hasher = MinHasher(self.rows * bands)
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._buckets: dict[tuple, set[tuple]] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.reuses = 0
+        self.evictions = 0
+
+    def _bands(self, scope: tuple, grams: frozenset[str]) -> list[tuple]:
+        sig = self.hasher.signature(grams)
+        return [(scope, i, sig[i * self.rows:(i + 1) * self.rows]) for i in range(len(sig) // self.rows)]
+
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def get(self, key: tuple) -> str | None:
+        """request_key のキーに近い過去の言い訳（なければ None）"""
+        if self.max_entries <= 0:
+            return None
+        scope, detail = key[:3], key[3]
+        grams = shingles(detail)
+        if not grams:
+            return None
+        bands = self._bands(scope, grams)
+        when = time_expression(detail)
+        now = time.monotonic()
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for band in bands:
+                candidates |= self._buckets.get(band, set())
+            best, best_score = None, self.threshold
+            for candidate in candidates:
+                entry = self._entries[candidate]
+                if candidate == key or entry.when != when:
+                    continue
+                live = [e for e in entry.excuses if e[0] > now]
+                if not live:
+                    continue
+                score = len(grams & entry.grams) / len(grams | entry.grams)
+                if score >= best_score:
+                    best, best_score = (candidate, live), score
+            if best is None:
+                return None
+            self._entries.move_to_end(best[0])
+            self.reuses += 1
+            return random.choice(best[1])[1]
+
+    def put(self, key: tuple, text: str) -> None:
+        if self.max_entries <= 0 or not text:
+            return
+        grams = shingles(key[3])
+        if not grams:
+            return
+        bands = self._bands(key[:3], grams)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(key[:3], grams, bands, time_expression(key[3]))
+                for band in bands:
+                    self._buckets.setdefault(band, set()).add(key)
+            entry.excuses = [e for e in entry.excuses if e[0] > now and e[1] != text][-(SIMILAR_VARIANTS - 1):]
+            entry.excuses.append((now + self.ttl, text))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "reuses": self.reuses,
+                "evictions": self.evictions,
+                "reuse_rate": round(self.reuses / self.lookups, 4) if self.lookups else 0.0,
+            }
@@ -0,0 +1,92 @@
+# backend/singleflight.py
+import os, asyncio
+
+SINGLEFLIGHT_FANOUT = os.getenv("EXCUSE_SINGLEFLIGHT_FANOUT", "share")  # share | variants
+SINGLEFLIGHT_CANDIDATES = int(os.getenv("EXCUSE_SINGLEFLIGHT_CANDIDATES", "4"))
+
+
+class _Flight:
+    __slots__ = ("task", "joined")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.joined = 0
+
+
+class SingleFlight:
+    """同じキーのリクエストが処理中なら、その結果を待って共有する。
+
+    fanout="share" は1件の結果を全員で共有し、fanout="variants" は
+    candidates 件の候補を1回で取り、到着順に別々の候補を配る。
+    """
+
+    def __init__(self, fanout: str = SINGLEFLIGHT_FANOUT, candidates: int = SINGLEFLIGHT_CANDIDATES):
+        if fanout not in ("share", "variants"):
+            raise ValueError(f"不明な fanout: {fanout}")
+        self.fanout = fanout
+        self.candidates = max(1, candidates)
+        self._flights: dict[tuple, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: tuple, call) -> str:
+        """call(n) は n 件までの候補リストを返すコルーチン関数"""
+        joined = self.join(key)
+        if joined is not None:
+            return await joined
+        n = self.candidates if self.fanout == "variants" else 1
+        self._start(key, asyncio.ensure_future(call(n)))
+        return self._pick(await asyncio.shield(self._flights[key].task), 0)
+
+    def lead(self, key: tuple) -> asyncio.Future:
+        """結果を呼び出し側が set_result([text]) / set_exception で渡すフライトを始める
+
+        ストリーミングのように結果が少しずつ届く処理の先頭に使う。進行中のものがないときだけ呼ぶ。
+        """
+        future = asyncio.get_running_loop().create_future()
+        # 待機者がいなくても例外が「取得されなかった」と警告されないようにする
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._start(key, future)
+        return future
+
+    def join(self, key: tuple):
+        """同じキーが処理中ならその結果を待つコルーチン、なければ None"""
+        flight = self._flights.get(key)
+        if flight is None:
+            return None
+        flight.joined += 1
+        self.coalesced += 1
+        return self._wait(flight, flight.joined)
+
+    def _start(self, key: tuple, task: asyncio.Future) -> None:
+        flight = _Flight(task)
+        self._flights[key] = flight
+        task.add_done_callback(lambda _t: self._forget(key, flight))
+        self.leaders += 1
+
+    async def _wait(self, flight: _Flight, index: int) -> str:
+        # 先頭のリクエストが切断されても他の待機者の分は続行させる
+        return self._pick(await asyncio.shield(flight.task), index)
+
+    def _pick(self, texts: list[str], index: int) -> str:
+        if self.fanout == "share":
+            return texts[0]
+        return texts[index % len(texts)]
+
+    def _forget(self, key: tuple, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "fanout": self.fanout,
+            "candidates": self.candidates,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,136 @@
+# backend/sqlite_repository.py
+import os, json, sqlite3, threading, logging
+
+from repository import ExcuseRepository
+from search_index import normalize_text, split_terms
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BUSY_TIMEOUT = float(os.getenv("EXCUSE_SQLITE_BUSY_TIMEOUT", "5"))
+
+SCHEMA = """
+create table if not exists excuses (
+    id integer primary key autoincrement,
+    title text not null default '',
+    description text not null,
+    category text not null default ''
+);
+create index if not exists excuses_category_idx on excuses (category);
+"""
+
+# 全文検索用の索引。本文を「2文字ずつずらした語」の並びにして入れ、2文字の語も索引で引けるようにする
+# （trigram トークナイザは3文字未満を引けないため）。検索語は同じ2文字の並びのフレーズとして照合する。
+# 表示用の本文は excuses から取るので索引側は中身を持たない
+FTS_SCHEMA = """
+create virtual table if not exists excuses_fts using fts5(
+    title, description, content = '', tokenize = 'ascii'
+);
+"""
+
+# SQL は定数にしておき、接続ごとの文キャッシュ（コンパイル済みの文）を使い回させる
+PAGE_SQL = "select id, title, description, category from excuses where id > ? order by id limit ?"
+GET_SQL = "select id, title, description, category from excuses where id = ?"
+# id の一覧は JSON 配列1つで渡し、件数によらず同じ文にする
+ROWS_SQL = "select id, title, description, category from excuses where id in (select value from json_each(?))"
+INSERT_SQL = "insert into excuses (title, description, category) values (?, ?, ?)"
+COUNT_SQL = "select category, count(*) from excuses where category != '' group by category"
+FTS_INSERT_SQL = "insert into excuses_fts (rowid, title, description) values (?, ?, ?)"
+# タイトルでの一致を本文の2倍に重み付けする
+FTS_SEARCH_SQL = (
+    "select excuses.id, excuses.title, excuses.description, excuses.category "
+    "from excuses_fts join excuses on excuses.id = excuses_fts.rowid "
+    "where excuses_fts match ? order by bm25(excuses_fts, 2.0, 1.0), excuses.id desc limit ? offset ?"
+)
+FTS_COUNT_SQL = "select count(*) from excuses_fts where excuses_fts match ?"
+FTS_BACKFILL_SQL = "select id, title, description from excuses where id > (select coalesce(max(rowid), 0) from excuses_fts) order by id"
+
+
+def _bigram_tokens(text: str) -> str:
+    """「電車遅延」→「電車 車遅 遅延 延」（末尾の1文字は1文字検索の前方一致用）"""
+    return " ".join(segment[i:i + 2] for segment in normalize_text(text).split() for i in range(len(segment)))
+
+
+def _match_query(terms: list[str]) -> str:
+    phrases = []
+    for term in terms:
+        if len(term) == 1:
+            phrases.append('"' + term.replace('"', '""') + '"*')
+        else:
+            tokens = " ".join(term[i:i + 2] for i in range(len(term) - 1))
+            phrases.append('"' + tokens.replace('"', '""') + '"')
+    return " ".join(phrases)
+
+
+class SqliteRepository(ExcuseRepository):
+    """ローカルの SQLite ファイルを使う実装
+
+    WAL モードで読み取りと書き込みを並行させ、接続はスレッドごとに1本持つ
+    （run_query のワーカースレッド数だけ接続ができる）。id は主キー（rowid）、
+    category には索引を張る。検索は FTS5 の2文字索引で bm25 順に返す。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            conn.executescript(FTS_SCHEMA)
+            # 索引より後に入った行（索引導入前のデータや外部からの追加）を取り込む
+            backfill = conn.execute(FTS_BACKFILL_SQL).fetchall()
+            conn.executemany(FTS_INSERT_SQL, ((row["id"], _bigram_tokens(row["title"]), _bigram_tokens(row["description"]))
+                                              for row in backfill))
+        if backfill:
+            logger.info(f"検索索引に {len(backfill)}件を追加しました")
+        logger.info(f"SQLite: {os.path.abspath(path)}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            conn.execute("pragma journal_mode=wal")
+            # WAL では NORMAL でもコミット済みのデータは壊れない（電源断時に直近の数件が戻りうる）
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+        return conn
+
+    def page(self, after: int, limit: int) -> list[dict]:
+        return [dict(row) for row in self._conn().execute(PAGE_SQL, (after, limit))]
+
+    def get(self, excuse_id: int) -> dict | None:
+        row = self._conn().execute(GET_SQL, (excuse_id,)).fetchone()
+        return dict(row) if row else None
+
+    def create_many(self, rows: list[dict]) -> list[dict]:
+        conn = self._conn()
+        created = []
+        # 1トランザクションにまとめて fsync を1回にする
+        with conn:
+            for row in rows:
+                values = (row.get("title", ""), row["description"], row.get("category", ""))
+                cursor = conn.execute(INSERT_SQL, values)
+                conn.execute(FTS_INSERT_SQL, (cursor.lastrowid, _bigram_tokens(values[0]), _bigram_tokens(values[1])))
+                created.append({"id": cursor.lastrowid, "title": values[0],
+                                "description": values[1], "category": values[2]})
+        return self._added(created)
+
+    def _count_categories(self) -> dict:
+        return {row[0]: row[1] for row in self._conn().execute(COUNT_SQL)}
+
+    def _rows(self, ids: list[int]) -> list[dict]:
+        if not ids:
+            return []
+        by_id = {row["id"]: dict(row) for row in self._conn().execute(ROWS_SQL, (json.dumps(ids),))}
+        return [by_id[excuse_id] for excuse_id in ids if excuse_id in by_id]
+
+    def search(self, query: str, limit: int, offset: int = 0) -> tuple[int, list[dict]]:
+        terms = split_terms(query)
+        if not terms:
+            return 0, []
+        conn = self._conn()
+        match = _match_query(terms)
+        total = conn.execute(FTS_COUNT_SQL, (match,)).fetchone()[0]
+        return total, [dict(row) for row in conn.execute(FTS_SEARCH_SQL, (match, limit, offset))]
@@ -0,0 +1,14 @@
+-- カテゴリごとの件数を返す集計関数（/api/categories の起動時ロード用）
+-- Supabase の SQL Editor で実行してください。
+create or replace function excuse_category_counts()
+returns table (category text, count bigint)
+language sql
+stable
+as $$
+  select category, count(*) as count
+  from excuses
+  group by category
+$$;
+
+-- group by を索引だけで処理できるようにする
+create index if not exists excuses_category_idx on excuses (category);
@@ -0,0 +1,111 @@
+# bench/cold_start.py
+"""バックエンドのコールドスタート計測（import 時間と起動から1件目の応答まで）
+
+毎回新しい Python プロセスで main を import し、
+import・lifespan の起動・最初の /health・最初のモデル用クライアント生成にかかった時間を測る。
+あわせて python -X importtime で import に時間のかかったモジュールの上位を出す。
+結果は JSON（各回の中央値）で出力するので、前回の値と比べて退行を見つける。
+
+    python bench/cold_start.py --runs 5
+    python bench/cold_start.py --prewarm --output cold_start.json
+"""
+import os, sys, json, argparse, statistics, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+
+# 子プロセスで実行する計測本体（ネットワークには出ない）
+PROBE = r"""
+import json, time, asyncio
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def first_request():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://probe") as client:
+            response = await client.get("/health")
+        return ready, time.perf_counter(), response.status_code
+
+ready, responded, status = asyncio.run(first_request())
+client_started = time.perf_counter()
+main.gemini.keys.keys[0].client
+client_ready = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_response_ms": (responded - ready) * 1000,
+    "ready_ms": (responded - started) * 1000,
+    "genai_client_ms": (client_ready - client_started) * 1000,
+    "status": status,
+}))
+"""
+
+
+def _env(args) -> dict:
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "bench")
+    env.setdefault("EXCUSE_STORAGE", "memory")
+    env["EXCUSE_POOL_ENABLED"] = "0"
+    env["EXCUSE_PREWARM"] = "1" if args.prewarm else "0"
+    return env
+
+
+def probe(args) -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND, env=_env(args),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(args, top: int) -> list[dict]:
+    """python -X importtime の出力から、累計時間の長いトップレベルに近いモジュールを返す"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND,
+                         env=_env(args), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"（名前の字下げが深さ）
+        head, cumulative_us, name = line.split("|")
+        self_us = head.split(":")[1]
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({"module": name.strip(), "depth": depth,
+                     "self_ms": round(int(self_us) / 1000, 1),
+                     "cumulative_ms": round(int(cumulative_us) / 1000, 1)})
+    rows = [r for r in rows if r["depth"] <= 1]
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="import に時間のかかったモジュールを何件出すか")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="EXCUSE_PREWARM=1 で計測する（実際の API キーがないと prewarm は失敗してログに出るだけ）")
+    parser.add_argument("--output", help="結果の JSON を書き出すファイル（省略時は標準出力）")
+    args = parser.parse_args()
+
+    runs = [probe(args) for _ in range(args.runs)]
+    fields = ("import_ms", "startup_ms", "first_response_ms", "ready_ms", "genai_client_ms")
+    report = {
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "median": {f: round(statistics.median(r[f] for r in runs), 1) for f in fields},
+        "max": {f: round(max(r[f] for r in runs), 1) for f in fields},
+        "status": sorted({r["status"] for r in runs}),
+        "imports": import_profile(args, args.top),
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
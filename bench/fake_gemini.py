@@ -0,0 +1,127 @@
+# bench/fake_gemini.py
+"""ベンチマーク用の Gemini クライアント（ネットワークに出ない）
+
+genai.Client のうち GeminiClient が使う部分（models / aio.models の
+generate_content と generate_content_stream）だけを真似る。
+応答時間は対数正規分布、一定の割合で 503 と空の応答を返す。
+"""
+import json, math, time, random, asyncio, threading
+from types import SimpleNamespace
+
+from google.genai import errors
+
+SAMPLE_TEXTS = (
+    "申し訳ありません、電車の遅延により10分ほど遅れます。",
+    "ごめん、寝坊しちゃって15分くらい遅れる！先に始めてて。",
+    "すみません、前の予定が長引いており少し遅れます。",
+)
+
+
+def _response(texts: list[str], prompt_tokens: int = 0):
+    candidates = [SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=t)])) for t in texts]
+    # トークン数は1文字1トークンとしたおおよその値
+    output_tokens = sum(len(t) for t in texts)
+    usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+                            cached_content_token_count=None, total_token_count=prompt_tokens + output_tokens)
+    return SimpleNamespace(text=texts[0], candidates=candidates, usage_metadata=usage)
+
+
+def _prompt_tokens(contents, config) -> int:
+    system = getattr(config, "system_instruction", None) or ""
+    return len(system if isinstance(system, str) else "") + len(contents if isinstance(contents, str) else "".join(contents))
+
+
+class FakeModelStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.injected_503 = 0
+        self.injected_empty = 0
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"attempts": self.attempts, "injected_503": self.injected_503,
+                    "injected_empty": self.injected_empty}
+
+
+class _Models:
+    def __init__(self, owner: "FakeGenAIClient"):
+        self.owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        delay, outcome = self.owner.draw()
+        time.sleep(delay)
+        return self.owner.result(outcome, config, _prompt_tokens(contents, config))
+
+
+class _AioModels:
+    def __init__(self, owner: "FakeGenAIClient"):
+        self.owner = owner
+
+    async def generate_content(self, model, contents, config=None):
+        delay, outcome = self.owner.draw()
+        await asyncio.sleep(delay)
+        return self.owner.result(outcome, config, _prompt_tokens(contents, config))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        delay, outcome = self.owner.draw()
+        await asyncio.sleep(delay)
+        prompt_tokens = _prompt_tokens(contents, config)
+        text = self.owner.result(outcome, config).text
+
+        async def chunks():
+            # 最初の断片までを delay とし、残りは短い間隔で流す
+            for i in range(0, len(text), 8):
+                chunk = _response([text[i:i + 8]], prompt_tokens)
+                # 本物と同じく usage_metadata はそこまでの累計にする
+                chunk.usage_metadata.candidates_token_count = min(len(text), i + 8)
+                yield chunk
+                await asyncio.sleep(0.005)
+            if not text:
+                yield _response([""], prompt_tokens)
+        return chunks()
+
+
+class FakeGenAIClient:
+    """latency_ms（中央値）と sigma の対数正規分布で待ってから応答する"""
+
+    def __init__(self, latency_ms: float = 400, sigma: float = 0.5, error_rate: float = 0.0,
+                 empty_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency_ms / 1000
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.empty_rate = empty_rate
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats = FakeModelStats()
+        self.models = _Models(self)
+        self.aio = SimpleNamespace(models=_AioModels(self))
+
+    def draw(self) -> tuple[float, str]:
+        with self._rng_lock:
+            delay = self.latency * math.exp(self.rng.gauss(0, self.sigma)) if self.latency > 0 else 0.0
+            roll = self.rng.random()
+        self.stats.count("attempts")
+        if roll < self.error_rate:
+            return delay, "503"
+        if roll < self.error_rate + self.empty_rate:
+            return delay, "empty"
+        return delay, "ok"
+
+    def result(self, outcome: str, config, prompt_tokens: int = 0):
+        if outcome == "503":
+            self.stats.count("injected_503")
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "overloaded (fake)", "status": "UNAVAILABLE"}})
+        if outcome == "empty":
+            self.stats.count("injected_empty")
+            return _response([""], prompt_tokens)
+        n = getattr(config, "candidate_count", None) or 1
+        with self._rng_lock:
+            texts = [self.rng.choice(SAMPLE_TEXTS) for _ in range(n)]
+        if getattr(config, "response_mime_type", None) == "application/json":
+            return _response([json.dumps(list(SAMPLE_TEXTS), ensure_ascii=False)], prompt_tokens)
+        return _response(texts, prompt_tokens)
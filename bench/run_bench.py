@@ -0,0 +1,222 @@
+# bench/run_bench.py
+"""FastAPI バックエンドと Django プロキシの負荷・レイテンシ計測（オフラインで動く）
+
+バックエンドは同じプロセス内の uvicorn で起動し、GeminiClient の接続先を
+fake_gemini.FakeGenAIClient に差し替える。Django は WSGI サーバで起動し、
+そのバックエンドに向ける。結果（p50/p95/p99・スループット・リトライ増幅率）は JSON で出力する。
+
+    python bench/run_bench.py --requests 500 --concurrency 32 --latency-ms 300 --error-rate 0.05
+    python bench/run_bench.py --targets generate --output bench_output.json
+"""
+import os, sys, json, time, random, socket, asyncio, argparse, threading
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+FRONTEND = os.path.join(ROOT, "frontend")
+
+TARGETS = ("generate", "list", "django_list", "django_categories")
+
+DETAILS = ("", "駅で待っています", "電車が止まっている", "家を出るのが遅れた", "道が混んでいる", "財布を忘れて取りに戻った")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], statuses: dict, seconds: float, extra: dict | None = None) -> dict:
+    values = sorted(latencies)
+    ok = sum(n for code, n in statuses.items() if 200 <= int(code) < 400)
+    return {
+        "requests": len(values),
+        "ok": ok,
+        "errors": len(values) - ok,
+        "status": statuses,
+        "seconds": round(seconds, 3),
+        "rps": round(len(values) / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(_percentile(values, 50), 1),
+        "p95_ms": round(_percentile(values, 95), 1),
+        "p99_ms": round(_percentile(values, 99), 1),
+        "max_ms": round(values[-1], 1) if values else 0.0,
+        **(extra or {}),
+    }
+
+
+async def drive(make_request, total: int, concurrency: int) -> dict:
+    """total 件のリクエストを concurrency 本の並行で投げる"""
+    import httpx
+    latencies, statuses, sources = [], {}, {}
+    remaining = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        async def worker():
+            for i in remaining:
+                method, url, body = make_request(i)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, url, json=body)
+                    code = str(response.status_code)
+                    if response.status_code == 200 and body is not None:
+                        source = response.json().get("source", "ai")
+                        sources[source] = sources.get(source, 0) + 1
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - started
+    return summarize(latencies, statuses, seconds, {"sources": sources} if sources else None)
+
+
+def start_backend(args, fake):
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    os.environ.setdefault("EXCUSE_POOL_ENABLED", "0")
+    os.environ.setdefault("EXCUSE_STORAGE", "memory")
+    # 計測したいのはアプリ自体の性能なので、レート制限は明示しない限り外す
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    sys.path.insert(0, BACKEND)
+    cwd = os.getcwd()
+    os.chdir(BACKEND)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    import uvicorn
+
+    for key in main.gemini.keys.keys:
+        key.client = fake
+    # 論理的な呼び出し回数（リトライを除く）を数えてリトライ増幅率を出す
+    logical = {"calls": 0}
+    aretry = main.gemini._aretry
+
+    async def counting_aretry(call, *args):
+        logical["calls"] += 1
+        return await aretry(call, *args)
+    main.gemini._aretry = counting_aretry
+
+    if args.seed_rows:
+        main.excuses_db.create_many([
+            {"title": f"言い訳{i}", "description": f"ベンチ用の言い訳 {i}", "category": f"カテゴリ{i % 8}"}
+            for i in range(args.seed_rows)
+        ])
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return main, server, f"http://127.0.0.1:{port}", logical
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_django(backend_url: str):
+    os.environ["API_BASE_URL"] = backend_url
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "frontend.settings")
+    os.environ.setdefault("SUPERUSER_NAME", "bench")
+    os.environ.setdefault("SUPERUSER_EMAIL", "bench@example.com")
+    os.environ.setdefault("SUPERUSER_PASSWORD", "bench")
+    os.environ.setdefault("DEBUG", "False")
+    os.environ["ALLOWED_HOSTS"] = "127.0.0.1,localhost"
+    sys.path.insert(0, FRONTEND)
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+    port = _free_port()
+    server = make_server("127.0.0.1", port, application, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"カンマ区切り（{', '.join(TARGETS)}）")
+    parser.add_argument("--requests", type=int, default=300, help="ターゲットごとのリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=400, help="偽モデルの応答時間の中央値")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="対数正規分布の sigma（大きいほど裾が重い）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 を返す割合")
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="空の応答を返す割合")
+    parser.add_argument("--mode", choices=("ai", "auto"), default="auto", help="/generate_excuse の mode")
+    parser.add_argument("--unique-details", type=float, default=1.0,
+                        help="/generate_excuse で毎回異なる detail にする割合（残りは少数の定型文を使い回す）")
+    parser.add_argument("--seed-rows", type=int, default=1000, help="/api/excuses 用に入れておく件数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果の JSON を書き出すファイル（省略時は標準出力）")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"未知のターゲット: {', '.join(sorted(unknown))}")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fake_gemini import FakeGenAIClient
+    fake = FakeGenAIClient(args.latency_ms, args.latency_sigma, args.error_rate, args.empty_rate, seed=args.seed)
+    backend, server, backend_url, logical = start_backend(args, fake)
+    django_url = None
+    if any(t.startswith("django_") for t in targets):
+        _, django_url = start_django(backend_url)
+
+    from excuse_pool import MINUTES, CAUSES, TARGETS as PEOPLE
+    rng = random.Random(args.seed)
+
+    def generate_request(i):
+        detail = f"{rng.choice(DETAILS)} #{i}" if rng.random() < args.unique_details else rng.choice(DETAILS)
+        body = {"minutes": rng.choice(MINUTES), "cause": rng.choice(CAUSES), "target": rng.choice(PEOPLE),
+                "detail": detail, "mode": args.mode}
+        return "POST", f"{backend_url}/generate_excuse", body
+
+    def list_request(i):
+        return "GET", f"{backend_url}/api/excuses?limit=100&after={rng.randrange(max(args.seed_rows, 1))}", None
+
+    requests_for = {
+        "generate": generate_request,
+        "list": list_request,
+        "django_list": lambda i: ("GET", f"{django_url}/api/excuses/?limit=100", None),
+        "django_categories": lambda i: ("GET", f"{django_url}/api/categories/", None),
+    }
+
+    results = {}
+    for target in targets:
+        results[target] = asyncio.run(drive(requests_for[target], args.requests, args.concurrency))
+
+    model = fake.stats.snapshot()
+    model["logical_calls"] = logical["calls"]
+    model["retry_amplification"] = round(model["attempts"] / logical["calls"], 3) if logical["calls"] else 0.0
+    report = {
+        "config": vars(args),
+        "results": results,
+        "model": model,
+        "server": backend.generate_excuse_stats(),
+    }
+    server.should_exit = True
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import BACKEND_LATENCY, backend_path_label
+
+logger = logging.getLogger(__name__)
+
+
+class BackendClient:
+    """FastAPIバックエンドへの共有HTTPクライアント
+
+    keep-alive の接続プールを使い回し、接続/読み取りのタイムアウトを分けて設定する。
+    再試行は冪等な GET/HEAD のみ。
+    """
+
+    def __init__(self, base_url, pool_size=10, connect_timeout=2.0, read_timeout=10.0, retries=2):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+            # Retry-After（検索索引の準備中など）まで待つとワーカーを塞ぐので、待ちは backoff だけにする
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            status = str(response.status_code)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.info("backend %s %s %.1fms", method, path, elapsed_ms)
+            BACKEND_LATENCY.labels(method, backend_path_label(path), status).observe(elapsed_ms / 1000)
+        # 再試行を含めた所要時間（ビューで Server-Timing に載せる）
+        response.latency_ms = elapsed_ms
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_backend():
+    """プロセス内で共有する BackendClient を返す"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = BackendClient(
+                    settings.BACKEND_API_BASE_URL,
+                    pool_size=settings.BACKEND_POOL_SIZE,
+                    connect_timeout=settings.BACKEND_CONNECT_TIMEOUT,
+                    read_timeout=settings.BACKEND_READ_TIMEOUT,
+                    retries=settings.BACKEND_GET_RETRIES,
+                )
+    return _client
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+import requests
+
+from excuses.backend_client import get_backend
+
+
+class Command(BaseCommand):
+    help = "バックエンドの言い訳を NDJSON / CSV ファイルに書き出します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="出力先ファイル")
+        parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+        parser.add_argument("--timeout", type=float, default=300, help="読み取りタイムアウト（秒）")
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        start = time.perf_counter()
+        rows = 0
+        try:
+            response = backend.get(
+                "/api/excuses/export",
+                params={"format": options["format"]},
+                stream=True,
+                timeout=(backend.timeout[0], options["timeout"]),
+            )
+            response.raise_for_status()
+            # 受け取った分から順にファイルへ書き、全件をメモリに載せない
+            with open(options["path"], "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    rows += chunk.count(b"\n")
+                    f.write(chunk)
+        except (OSError, requests.RequestException) as e:
+            raise CommandError(str(e))
+
+        if options["format"] == "csv":
+            rows = max(rows - 1, 0)
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows}件を書き出しました / {seconds:.2f}秒 ({rows / seconds if seconds else 0:.1f} rows/s)"
+        ))
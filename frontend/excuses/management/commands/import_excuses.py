@@ -0,0 +1,53 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+import requests
+
+from excuses.backend_client import get_backend
+
+CONTENT_TYPES = {".csv": "text/csv", ".ndjson": "application/x-ndjson", ".jsonl": "application/x-ndjson"}
+
+
+class Command(BaseCommand):
+    help = "NDJSON / CSV ファイルの言い訳をバックエンドに一括登録します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="取り込むファイル（.csv / .ndjson / .jsonl）")
+        parser.add_argument("--timeout", type=float, default=300, help="読み取りタイムアウト（秒）")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower())
+        if content_type is None:
+            raise CommandError(f"未対応の拡張子です: {path}")
+
+        backend = get_backend()
+        start = time.perf_counter()
+        try:
+            # ファイルはメモリに載せずにそのまま本文として送る
+            with open(path, "rb") as f:
+                response = backend.post(
+                    "/api/excuses/bulk",
+                    data=f,
+                    headers={"Content-Type": content_type},
+                    timeout=(backend.timeout[0], options["timeout"]),
+                )
+            response.raise_for_status()
+        except (OSError, requests.RequestException) as e:
+            raise CommandError(str(e))
+
+        stats = response.json()
+        seconds = time.perf_counter() - start
+        for error in stats["errors"]:
+            # 不正な行は line、登録に失敗したチャンクは lines（"10-2009" のような範囲）で返る
+            self.stderr.write(f"{error.get('line') or error['lines']}行目: {error['error']}")
+        failed = stats.get("failed", 0)
+        summary = (
+            f"登録 {stats['inserted']}件 / 不正 {stats['rejected']}件 / 失敗 {failed}件 / "
+            f"{seconds:.2f}秒 ({stats['inserted'] / seconds if seconds else 0:.1f} rows/s)"
+        )
+        if failed:
+            # 一部のチャンクが登録されていないので成功扱いにしない（終了コード 1）
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,58 @@
+import os
+import re
+import time
+
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Gauge, Histogram, REGISTRY, generate_latest
+
+# 秒単位（バックエンド側 metrics.py と同じ区切り）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+
+REQUEST_LATENCY = Histogram(
+    "excuse_frontend_request_duration_seconds", "ビューごとの応答時間",
+    ("method", "view", "status"), buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge("excuse_frontend_requests_in_flight", "処理中のリクエスト数", multiprocess_mode="livesum")
+BACKEND_LATENCY = Histogram(
+    "excuse_frontend_backend_request_duration_seconds", "バックエンド API 呼び出しの所要時間（再試行を含む）",
+    ("method", "path", "status"), buckets=LATENCY_BUCKETS,
+)
+
+_ID = re.compile(r"/\d+(?=/|$)")
+
+
+def backend_path_label(path):
+    """/api/excuses/12 → /api/excuses/{id}（ラベルの種類が増えすぎないように）"""
+    return _ID.sub("/{id}", path)
+
+
+class MetricsMiddleware:
+    """ビュー単位の応答時間と処理中の数を記録する"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        IN_FLIGHT.inc()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            IN_FLIGHT.dec()
+            match = getattr(request, "resolver_match", None)
+            view = match.view_name if match else "unmatched"
+            REQUEST_LATENCY.labels(request.method, view, str(status)).observe(time.perf_counter() - start)
+
+
+def metrics(request):
+    """Prometheus のテキスト形式でメトリクスを返す"""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # gunicorn の複数ワーカー分をまとめて返す
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
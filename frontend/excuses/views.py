@@ -1,36 +1,147 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import requests
 import json
+import time
 
-# FastAPIバックエンドのベースURL
-API_BASE_URL = "http://localhost:8001"
+from .backend_client import get_backend
+
+NDJSON = "application/x-ndjson"
 
 def index(request):
     """メインページを表示"""
     return render(request, 'excuses/index.html')
 
+def _backend_json(response, safe=True):
+    """バックエンドの応答を JsonResponse にし、所要時間を Server-Timing に載せる"""
+    result = JsonResponse(response.json(), safe=safe)
+    result['Server-Timing'] = f"backend;dur={response.latency_ms:.1f}"
+    return result
+
+# バックエンドが「後で再試行して」と返したものは 500 にせず、Retry-After ごとそのまま返す
+PASSTHROUGH_STATUS = (429, 503)
+
+def _backend_error(e):
+    response = getattr(e, "response", None)
+    if isinstance(e, requests.HTTPError) and response is not None and response.status_code in PASSTHROUGH_STATUS:
+        result = HttpResponse(response.content, status=response.status_code,
+                              content_type=response.headers.get("Content-Type", "application/json"))
+        if response.headers.get("Retry-After"):
+            result["Retry-After"] = response.headers["Retry-After"]
+        return result
+    if isinstance(e, requests.Timeout):
+        return JsonResponse({"error": f"バックエンドの応答がタイムアウトしました: {e}"}, status=504)
+    return JsonResponse({"error": str(e)}, status=500)
+
+# 一覧系プロキシのキャッシュ世代（作成成功時に進めて、クエリ違いも含めまとめて無効化する）
+LIST_CACHE_GENERATION = "excuses:proxy:generation"
+
+def _list_generation():
+    cache.add(LIST_CACHE_GENERATION, 1, None)
+    return cache.get(LIST_CACHE_GENERATION, 1)
+
+def _invalidate_lists():
+    try:
+        cache.incr(LIST_CACHE_GENERATION)
+    except ValueError:
+        cache.set(LIST_CACHE_GENERATION, 2, None)
+
+def _cached_get(request, path):
+    """バックエンドの一覧系 GET をキャッシュし、ETag/Last-Modified で条件付き応答する
+
+    TTL 内はキャッシュから返し、期限切れ後は保持している ETag で条件付き GET を行う。
+    ブラウザからの If-None-Match / If-Modified-Since が一致すれば 304 を返す。
+    """
+    query = request.GET.urlencode()
+    key = f"excuses:proxy:{_list_generation()}:{path}?{query}"
+    entry = cache.get(key)
+    latency = None
+    if entry is None or time.time() - entry["fetched_at"] >= settings.EXCUSES_CACHE_TTL:
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        response = get_backend().get(path, params=request.GET, headers=headers)
+        latency = response.latency_ms
+        if response.status_code == 304 and entry:
+            entry["fetched_at"] = time.time()
+        else:
+            response.raise_for_status()
+            entry = {
+                "body": response.content,
+                "etag": response.headers.get("ETag"),
+                "last_modified": parse_http_date_safe(response.headers.get("Last-Modified") or ""),
+                "next_after": response.headers.get("X-Next-After"),
+                "fetched_at": time.time(),
+            }
+        # 期限切れ後の再検証に使うため TTL より長く保持する
+        cache.set(key, entry, settings.EXCUSES_CACHE_TTL * 10)
+
+    result = get_conditional_response(request, etag=entry["etag"], last_modified=entry["last_modified"])
+    if result is None:
+        result = HttpResponse(entry["body"], content_type="application/json")
+    if entry["etag"]:
+        result["ETag"] = entry["etag"]
+    if entry["last_modified"]:
+        result["Last-Modified"] = http_date(entry["last_modified"])
+    if entry.get("next_after"):
+        # 次ページはこのプロキシの URL で案内する
+        # limit が指定されていなければ付けない（空の limit= はバックエンドで 422 になる）
+        next_query = request.GET.copy()
+        next_query["after"] = entry["next_after"]
+        if not next_query.get("limit"):
+            next_query.pop("limit", None)
+        result["Link"] = f'<{request.path}?{next_query.urlencode()}>; rel="next"'
+        result["X-Next-After"] = entry["next_after"]
+    result["Cache-Control"] = "no-cache"
+    result["Server-Timing"] = f"backend;dur={latency:.1f}" if latency is not None else "cache;dur=0"
+    return result
+
+def _streamed_get(request, path):
+    """バックエンドの NDJSON をバッファせずにそのまま流す"""
+    response = get_backend().get(path, params=request.GET, headers={"Accept": NDJSON}, stream=True)
+    response.raise_for_status()
+    result = StreamingHttpResponse(
+        response.iter_content(chunk_size=8192),
+        content_type=response.headers.get("Content-Type", NDJSON),
+    )
+    result["Server-Timing"] = f"backend;dur={response.latency_ms:.1f}"
+    return result
+
 @require_http_methods(["GET"])
 def get_excuses(request):
-    """全ての言い訳を取得"""
+    """言い訳を取得（limit/after でページング、format=ndjson でストリーミング）"""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/excuses")
-        response.raise_for_status()
-        return JsonResponse(response.json(), safe=False)
+        if request.GET.get("format") == "ndjson" or NDJSON in request.headers.get("Accept", ""):
+            return _streamed_get(request, "/api/excuses")
+        return _cached_get(request, "/api/excuses")
     except requests.RequestException as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return _backend_error(e)
+
+@require_http_methods(["GET"])
+def search_excuses(request):
+    """言い訳を検索（q, limit, offset をそのままバックエンドへ渡す）"""
+    if not request.GET.get("q", "").strip():
+        return JsonResponse({"error": "検索語（q）を指定してください"}, status=400)
+    try:
+        return _cached_get(request, "/api/excuses/search")
+    except requests.RequestException as e:
+        return _backend_error(e)
 
 @require_http_methods(["GET"])
 def get_excuse(request, excuse_id):
     """指定されたIDの言い訳を取得"""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/excuses/{excuse_id}")
+        response = get_backend().get(f"/api/excuses/{excuse_id}")
         response.raise_for_status()
-        return JsonResponse(response.json())
+        return _backend_json(response)
     except requests.RequestException as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return _backend_error(e)
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -38,18 +149,19 @@ def create_excuse(request):
     """新しい言い訳を作成"""
     try:
         data = json.loads(request.body)
-        response = requests.post(f"{API_BASE_URL}/api/excuses", json=data)
+        response = get_backend().post("/api/excuses", json=data)
         response.raise_for_status()
-        return JsonResponse(response.json())
-    except (json.JSONDecodeError, requests.RequestException) as e:
+        _invalidate_lists()
+        return _backend_json(response)
+    except json.JSONDecodeError as e:
         return JsonResponse({"error": str(e)}, status=500)
+    except requests.RequestException as e:
+        return _backend_error(e)
 
 @require_http_methods(["GET"])
 def get_categories(request):
     """利用可能なカテゴリを取得"""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/categories")
-        response.raise_for_status()
-        return JsonResponse(response.json())
+        return _cached_get(request, "/api/categories")
     except requests.RequestException as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return _backend_error(e)
@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'excuses.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -145,6 +146,23 @@ CORS_ALLOWED_ORIGINS = [
     "https://*.vercel.app",
 ]
 
+# FastAPIバックエンドへの接続設定
+BACKEND_API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8001')
+# 1プロセスあたりの keep-alive 接続数（gunicorn のスレッド数に合わせる）
+BACKEND_POOL_SIZE = int(os.environ.get('BACKEND_POOL_SIZE', os.environ.get('GUNICORN_THREADS', '10')))
+BACKEND_CONNECT_TIMEOUT = float(os.environ.get('BACKEND_CONNECT_TIMEOUT', '2'))
+BACKEND_READ_TIMEOUT = float(os.environ.get('BACKEND_READ_TIMEOUT', '10'))
+BACKEND_GET_RETRIES = int(os.environ.get('BACKEND_GET_RETRIES', '2'))
+
+# 一覧系プロキシのキャッシュ（秒）。作成時には明示的に無効化する
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'excuses',
+    }
+}
+EXCUSES_CACHE_TTL = int(os.environ.get('EXCUSES_CACHE_TTL', '30'))
+
 # REST Framework設定
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [